@@ -1,12 +1,18 @@
+import pkgutil
+import sys
+from functools import lru_cache
+from importlib import import_module
+from types import ModuleType
+from typing import Tuple
+
 import flask
 from flask_sqlalchemy import SQLAlchemy, event
-from werkzeug import find_modules, import_string
 
 from core.cache import cache, clear_cache_dirty
-from core.exceptions import _401Exception  # noqa
 from core.exceptions import (
     APIException,
     _312Exception,
+    _401Exception,
     _403Exception,
     _404Exception,
     _405Exception,
@@ -14,6 +20,22 @@ from core.exceptions import (
 )
 from core.serializer import NewJSONEncoder
 
+__all__ = [
+    'APIException',
+    'Config',
+    'NewJSONEncoder',
+    '_312Exception',
+    '_401Exception',
+    '_403Exception',
+    '_404Exception',
+    '_405Exception',
+    '_500Exception',
+    'cache',
+    'cached_import',
+    'db',
+    'init_app',
+]
+
 db = SQLAlchemy()
 
 
@@ -29,10 +51,15 @@ class Config:
     }
     # These are permissions which can be manipulated by users with basic
     # user editing capibilities that do not have full permissioning powers.
-    BASIC_PERMISSIONS = ['invites_send']
+    BASIC_PERMISSIONS = {'invites_send'}
 
 
 def init_app(app):
+    # Reuse the most recently returned pool connection, so that requests hit
+    # connections whose backend caches are already warm.
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).setdefault(
+        'pool_use_lifo', True
+    )
     db.init_app(app)
     cache.init_app(app)
     app.json_encoder = NewJSONEncoder
@@ -44,35 +71,66 @@ def init_app(app):
 
 
 def register_blueprints(app: flask.Flask) -> None:
-    # Every sub-view needs to be imported to populate the blueprint.
-    # If this is not done, we will have empty blueprints.
-    # If we register every module with the ``bp`` attribute normally,
-    # we would have a lot of duplicate routes, which Werkzeug doesn't filter.
-    for name in find_modules('core', recursive=True):
-        if not name.endswith('conftest'):
-            import_string(name)
-
-    # Now import and register each blueprint. Since each blueprint
-    # is defined in the package's __init__, we scan packages this time,
-    # unlike the last.
-    for name in find_modules('core', include_packages=True):
-        if not name.endswith('conftest'):
-            mod = import_string(name)
-            if hasattr(mod, 'bp'):
-                app.register_blueprint(mod.bp)
+    for name in _blueprint_manifest():
+        app.register_blueprint(cached_import(name).bp)
 
     # print(app.url_map)  # debug
 
 
+@lru_cache(maxsize=None)
+def _blueprint_manifest() -> Tuple[str, ...]:
+    """
+    Build a manifest of the packages in ``core`` which define a blueprint. Only
+    the modules inside those packages are imported here; plain modules outside
+    of them are left to be imported when first needed. The package tree does
+    not change over the lifetime of the interpreter, so the filesystem is only
+    walked the first time an app is created, in a single pass.
+
+    :return: A tuple of dotted paths of the packages with a ``bp`` attribute
+    """
+    manifest = []
+    # Packages are yielded before their contents, so a blueprint package is
+    # known by the time its sub-views are reached.
+    for _, name, ispkg in pkgutil.walk_packages(__path__, f'{__name__}.'):
+        if name.endswith('conftest'):
+            continue
+        package = '.'.join(name.split('.')[:2])
+        if name == package:
+            # Each blueprint is defined in its package's __init__.
+            if ispkg and hasattr(cached_import(name), 'bp'):
+                manifest.append(name)
+        elif package in manifest:
+            # Every sub-view needs to be imported to populate the blueprint.
+            # If this is not done, we will have empty blueprints.
+            cached_import(name)
+    return tuple(manifest)
+
+
+def cached_import(path: str) -> ModuleType:
+    """
+    Import a module by its dotted path. Modules that have already been imported
+    are returned straight from ``sys.modules``, skipping the import machinery.
+
+    :param path: The dotted path of the module
+    :return:     The imported module
+    """
+    try:
+        return sys.modules[path]
+    except KeyError:
+        return import_module(path)
+
+
 def register_error_handlers(app: flask.Flask) -> None:
-    app.register_error_handler(
-        APIException, lambda err: (flask.jsonify(err.message), err.status_code)
-    )
+    app.register_error_handler(APIException, _api_exception_handler)
     app.register_error_handler(404, _404_handler)
     app.register_error_handler(405, _405_handler)
     app.register_error_handler(500, _500_handler)
 
 
+def _api_exception_handler(err) -> Tuple[flask.Response, int]:
+    return flask.jsonify(err.message), err.status_code
+
+
 def _404_handler(_) -> flask.Response:
     if not getattr(flask.g, 'user', False):
         return flask.jsonify(_401Exception().message), 401
@@ -5,6 +5,17 @@ from flask_sqlalchemy import SignallingSession
 from redis import Redis
 from werkzeug.contrib.cache import RedisCache
 
+# The maximum number of keys sent in a single DEL command by ``delete_many``.
+DELETE_BATCH_SIZE = 512
+
+# Increment a key only if it exists, atomically.
+_INC_EXISTING = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
 
 class Cache(RedisCache):
     """
@@ -23,6 +34,7 @@ class Cache(RedisCache):
     def init_app(self, app: flask.Flask) -> None:
         # Required flask extension method.
         super().__init__(**app.config['REDIS_PARAMS'])
+        self._inc_existing = self._client.register_script(_INC_EXISTING)
 
     def inc(
         self, key: str, delta: int = 1, timeout: int = None
@@ -46,6 +58,23 @@ class Cache(RedisCache):
         flask.g.cache_keys['inc'].add(key)
         return value
 
+    def inc_existing(self, key: str, delta: int = 1) -> Optional[int]:
+        """
+        Increment a cache key only if it already exists. Unlike ``inc``, a
+        missing key is not created, so a counter that is not cached is left to
+        be recomputed the next time it is read.
+
+        :param key:   The cache key to increment
+        :param delta: How much to increment the cache key by
+
+        :return: The new value of the key, or ``None`` if it does not exist
+        """
+        key = key.lower()
+        value = self._inc_existing(keys=[self.key_prefix + key], args=[delta])
+        if value is not None:
+            flask.g.cache_keys['inc'].add(key)
+        return value
+
     def get(self, key: str) -> Any:
         """
         Look up the key in the cache and return the value for it.
@@ -143,11 +172,27 @@ class Cache(RedisCache):
         """
         Delete multiple keys from the cache.
 
+        Keys are sent in batched UNLINK commands over a single pipeline, so
+        this is one round-trip regardless of the number of keys. Unlike DEL,
+        UNLINK frees the values in the background, so large values don't block
+        the Redis server.
+
         :param keys: The keys to delete
-        :return:     Whether or not all keys have been deleted
+        :return:     Whether or not any of the keys have been deleted
         """
         lower_keys = [key.lower() for key in keys]
-        result = super().delete_many(*lower_keys)
+        if not lower_keys:
+            return False
+        # Use transaction=False to batch the UNLINKs into a single round-trip.
+        pipe = self._client.pipeline(transaction=False)
+        for i in range(0, len(lower_keys), DELETE_BATCH_SIZE):
+            pipe.unlink(
+                *(
+                    self.key_prefix + key
+                    for key in lower_keys[i : i + DELETE_BATCH_SIZE]
+                )
+            )
+        result = bool(sum(pipe.execute()))
         flask.g.cache_keys['delete_many'] |= set(lower_keys)
         return result
 
@@ -202,7 +247,9 @@ class Cache(RedisCache):
             except AttributeError:  # pragma: no cover
                 continue  # TODO: Log this
             to_cache[model.cache_key] = data
-        self.set_many(to_cache, timeout)
+        # ``set_many`` writes every model in one pipelined round trip.
+        if to_cache:
+            self.set_many(to_cache, timeout)
 
 
 cache = Cache()
@@ -2,14 +2,15 @@ import os
 import sys
 from collections import defaultdict
 from contextlib import contextmanager
-from enum import Enum
 from typing import Any, List
 
 import flask
 import pytest
+from sqlalchemy import event
 
 import core
 from core import cache, db
+from core.mixins import TestDataPopulator
 from core.test_data import CorePopulator
 from core.users.models import User
 
@@ -92,15 +93,7 @@ def check_dictionary(response, expected, list_=False, strict=False):
 def add_permissions(app_, *permissions):
     "Insert permissions into database for user_id 1 (authed user)."
     assert isinstance(app_, flask.Flask)
-    permissions = [
-        p if not isinstance(p, Enum) else p.value for p in permissions
-    ]
-    db.engine.execute(
-        f"""INSERT INTO users_permissions (user_id, permission) VALUES
-        (1, '"""
-        + "'), (1, '".join(permissions)
-        + "')"
-    )
+    TestDataPopulator.add_permissions(*permissions)
 
 
 def check_dupe_in_list(list_):
@@ -153,6 +146,36 @@ def authed_client(app, monkeypatch):
                 yield app.test_client()
 
 
+@pytest.fixture
+def sql_statements(client):
+    "Record the SQL statements executed while the test runs."
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def spy_populate(monkeypatch):
+    "Record the calls to a model's ``populate_models_from_pks``."
+
+    def spy(model):
+        calls = []
+        populate = model.populate_models_from_pks
+        monkeypatch.setattr(
+            model,
+            'populate_models_from_pks',
+            lambda *args: calls.append(args) or populate(*args),
+        )
+        return calls
+
+    return spy
+
+
 @contextmanager
 def set_globals(app_):
     def handler(sender, **kwargs):
@@ -184,3 +207,4 @@ def populate_db():
 def unpopulate_db():
     for p in POPULATORS[::-1]:
         p.unpopulate()
+    cache.clear()
@@ -2,10 +2,18 @@ import json
 
 import flask
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 from core.users.permissions import SitePermissions
 
 from . import bp
 
+_SUCCESS_PREFIX = b'{"status": "success", "response": '
+_FAILED_PREFIX = b'{"status": "failed", "response": '
+
 
 @bp.after_app_request
 def hook(response: flask.Response) -> flask.Response:
@@ -16,26 +24,39 @@ def hook(response: flask.Response) -> flask.Response:
 def wrap_response(response: flask.Response) -> None:
     """
     Wrap response with the homogenized response dictionary, containing
-    a ``status`` key.
+    a ``status`` key. The wrapper is assembled around the already-encoded
+    response body, so the body is never decoded and re-encoded.
 
     :param response: The flask response en route to user
     """
-    try:
-        data = json.loads(response.get_data())
-    except ValueError:
-        return response
+    if not response.is_json:
+        return
+    data = response.get_data()
+    if not data:
+        return
 
-    response_data = {
-        'status': 'success' if response.status_code // 100 == 2 else 'failed',
-        'response': data,
-    }
+    success = response.status_code // 100 == 2
+    body = [_SUCCESS_PREFIX if success else _FAILED_PREFIX, data]
 
     if flask.g.user and flask.g.user.has_permission(
         SitePermissions.MANAGE_CACHE_KEYS
     ):
-        # We can't encode sets to JSON.
-        response_data['cache_keys'] = {
-            k: list(v) for k, v in flask.g.cache_keys.items()
-        }
+        body.append(b', "cache_keys": ')
+        body.append(dump_cache_keys(flask.g.cache_keys))
+
+    body.append(b'}')
+    response.set_data(b''.join(body))
+
 
-    response.set_data(json.dumps(response_data))
+def dump_cache_keys(cache_keys: dict) -> bytes:
+    """
+    Encode the cache keys accessed during the request to JSON. ``orjson`` is
+    used when it is installed, as it encodes straight to bytes.
+
+    :param cache_keys: A dictionary of cache operations and sets of keys
+    :return:           The encoded cache keys
+    """
+    if orjson is not None:
+        return orjson.dumps(cache_keys, default=list)
+    # We can't encode sets to JSON.
+    return json.dumps({k: list(v) for k, v in cache_keys.items()}).encode()
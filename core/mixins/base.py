@@ -1,49 +1,88 @@
-from collections import defaultdict
 from enum import Enum
+from operator import itemgetter
+from string import Formatter
 from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    FrozenSet,
     List,
     Optional,
+    Tuple,
     Type,
     TypeVar,
     Union,
 )
 
 from flask_sqlalchemy import BaseQuery, Model
-from sqlalchemy import and_, func
-from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy import bindparam, func, text, tuple_
+from sqlalchemy.ext import baked
+from sqlalchemy.orm.attributes import (
+    InstrumentedAttribute,
+    instance_dict,
+    instance_state,
+)
 from sqlalchemy.orm.session import make_transient_to_detached
 from sqlalchemy.sql.elements import BinaryExpression
 
 from core import cache, db
+from core.utils.memoization import cached_classmethod
 
 if TYPE_CHECKING:
     from core.mixins.serializer import Serializer  # noqa: F401
 
 PKB = TypeVar('PKB', bound='PKBase')
 
+# The planner's row estimate of a table, used by ``PKBase.count`` for models
+# opting into approximate counts. Estimates are cached for a minute.
+APPROX_COUNT_QUERY = text(
+    'SELECT reltuples::bigint FROM pg_class '
+    'WHERE oid = CAST(:table AS regclass)'
+)
+APPROX_COUNT_TIMEOUT = 60
+
+# Caches the queries built and compiled for PK and attribute lookups.
+_bakery = baked.bakery()
+
 
 class BaseFunctionalityMixin:
     @classmethod
     def assign_attrs(cls, **kwargs):
+        """
+        Assign attributes to the class, allowing plugins to extend core models and
+        serializers. Assignment deliberately goes through ``setattr`` rather than
+        the class ``__dict__``: the declarative metaclass intercepts it to map any
+        columns or relationships passed in, and plain values already fall through
+        to ``type.__setattr__``.
+
+        :param kwargs: The attribute names and their values
+        """
         for key, val in kwargs.items():
             setattr(cls, key, val)
 
 
 class TestDataPopulator:
-    @staticmethod
-    def add_permissions(*permissions):
-        permissions = [
-            p if not isinstance(p, Enum) else p.value for p in permissions
-        ]
-        db.engine.execute(
-            f"""INSERT INTO users_permissions (user_id, permission) VALUES
-            (1, '"""
-            + "'), (1, '".join(permissions)
-            + "')"
-        )
+    _insert_permission = text(
+        'INSERT INTO users_permissions (user_id, permission) '
+        'VALUES (:user_id, :permission)'
+    )
+
+    @classmethod
+    def add_permissions(cls, *permissions):
+        if permissions:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    cls._insert_permission,
+                    [
+                        {
+                            'user_id': 1,
+                            'permission': (
+                                p if not isinstance(p, Enum) else p.value
+                            ),
+                        }
+                        for p in permissions
+                    ],
+                )
 
 
 class PKBase(Model, BaseFunctionalityMixin):
@@ -55,26 +94,50 @@ class PKBase(Model, BaseFunctionalityMixin):
     __cache_key__: Optional[str] = None
     __deletion_attr__: Optional[str] = None
     __serializer__: Optional[Type['Serializer']] = None
+    __approx_count__: bool = False
 
     @classmethod
-    def from_cache(cls, key: str, *, query: BaseQuery = None) -> Optional[PKB]:
+    def from_cache(
+        cls, key: str, *, query: Union[BaseQuery, baked.Result] = None
+    ) -> Optional[PKB]:
         data = cache.get(key)
         obj = cls._create_obj_from_cache(data)
         if obj:
             return obj
-        else:
-            cache.delete(key)
         if query:
             obj = query.scalar()
             cache.cache_model(obj)
+        if obj is None and data is not None:
+            # Invalid cached data is only overwritten if the model was found.
+            cache.delete(key)
         return obj
 
     @classmethod
-    def _create_obj_from_cache(cls: Type[PKB], data: Any) -> Optional[PKB]:
+    def _create_obj_from_cache(
+        cls: Type[PKB], data: Any, detached: bool = False
+    ) -> Optional[PKB]:
+        """
+        Create a model from its cached data. The model is added to the session
+        unless ``detached`` is passed, in which case it is left detached.
+
+        :param data:     The cached data of the model
+        :param detached: Whether or not to skip merging the model into the session
+        :return:         The model, or ``None`` if the data is invalid
+        """
         if cls._valid_data(data):
-            obj = cls(**data)
+            # Populate the instance the way the ORM loads rows, bypassing
+            # __init__ and the attribute events and history it would record.
+            obj = cls.__mapper__.class_manager.new_instance()
+            instance_dict(obj).update(data)
             make_transient_to_detached(obj)
-            obj = db.session.merge(obj, load=False)
+            if not detached:
+                # A full merge is only needed to copy the cached state onto an
+                # instance already in the session; otherwise, the new instance
+                # can be attached to the session directly.
+                if instance_state(obj).key in db.session.identity_map:
+                    obj = db.session.merge(obj, load=False)
+                else:
+                    db.session.add(obj)
             return obj
         return None
 
@@ -90,9 +153,63 @@ class PKBase(Model, BaseFunctionalityMixin):
         return (
             bool(data)
             and isinstance(data, dict)
-            and set(data.keys()) == set(cls.__table__.columns.keys())
+            and data.keys() == cls._column_keys()
         )
 
+    @cached_classmethod
+    def _column_keys(cls) -> FrozenSet[str]:
+        """
+        Get the names of the model's table columns.
+
+        :return: A frozenset of the column names
+        """
+        return frozenset(cls.__table__.columns.keys())
+
+    @cached_classmethod
+    def _primary_key_columns(cls) -> Tuple[InstrumentedAttribute, ...]:
+        """
+        Get the model's primary key column attributes, in primary key order.
+
+        :return: A tuple of the primary key column attributes
+        """
+        primary_key = cls.get_primary_key()
+        if isinstance(primary_key, str):
+            return (getattr(cls, primary_key),)
+        return tuple(getattr(cls, k) for k in primary_key)
+
+    @classmethod
+    def _cache_key_template(cls) -> str:
+        """
+        Convert the ``__cache_key__`` format string into a printf-style template
+        with named ``%(field)s`` placeholders, so that building a cache key does
+        not reparse the format string. The template is built once per
+        ``__cache_key__`` and stored on the class.
+
+        :return:           The printf-style cache key template
+        :raises NameError: If the cache key is undefined or improperly defined
+        """
+        cache_key = cls.__cache_key__
+        cached = cls.__dict__.get('__cache_key_template__')
+        if cached is not None and cached[0] is cache_key:
+            return cached[1]
+        parts = []
+        try:
+            if not cache_key:
+                raise ValueError
+            for literal, field, spec, conv in Formatter().parse(cache_key):
+                parts.append(literal.replace('%', '%%'))
+                if field is not None:
+                    if not field or spec or conv:
+                        raise ValueError
+                    parts.append(f'%({field})s')
+        except ValueError:
+            raise NameError(
+                'The cache key is undefined or improperly defined in this model.'
+            )
+        template = ''.join(parts)
+        cls.__cache_key_template__ = (cache_key, template)
+        return template
+
     @classmethod
     def get_many(
         cls: Type[PKB],
@@ -108,6 +225,8 @@ class PKBase(Model, BaseFunctionalityMixin):
         reverse: bool = False,
         pks: List[Union[int, str]] = None,
         expr_override: BinaryExpression = None,
+        detached: bool = False,
+        after: Union[int, str] = None,
     ) -> List[PKB]:
         """
         An abstracted function to get a list of PKs from the cache with a cache key,
@@ -139,40 +258,58 @@ class PKBase(Model, BaseFunctionalityMixin):
         :param expr_override:       If passed, this will override filter and order, and be
                                     called verbatim in a ``db.session.execute`` if the cache
                                     key does not exist
+        :param detached:            Whether or not to leave models built from cached data
+                                    detached from the session. Only meant for read-only
+                                    listings, as changes to detached models aren't persisted
+        :param after:               If passed, a keyset cursor: only the ``limit`` models
+                                    following this primary key are fetched, with
+                                    ``get_pks_after``. Overrides key, order and page
 
         :return:                    A list of objects matching the query specifications
         """
         extra_pks: List[Union[int, str]] = []
-        if pks is None:
-            pks = cls.get_pks_of_many(
-                key, filter, order, include_dead, expr_override
+        if after is not None and pks is None:
+            pks = cls.get_pks_after(
+                after, limit, filter, include_dead, reverse
             )
-        if reverse:
-            pks.reverse()
-        if page is not None and limit is not None:
+        else:
+            if pks is None:
+                pks = cls.get_pks_of_many(
+                    key, filter, order, include_dead, expr_override
+                )
+            if reverse:
+                pks.reverse()
+        if page is not None and limit is not None and after is None:
             all_next_pks = pks[(page - 1) * limit :]
             pks, extra_pks = all_next_pks[:limit], all_next_pks[limit:]
 
+        if not pks:
+            return []
+
         models: List[PKB] = []
+        if asrt is None and not required_properties:
+            # Nothing can be filtered out, so there is nothing to backfill.
+            cls.populate_models_from_pks(models, pks, filter, detached)
+            return models
+
         while not limit or len(models) < limit:
-            if pks:
-                cls.populate_models_from_pks(models, pks, filter)
-
-            # Check permissions on the models and filter out unwanted ones.
-            models = [m for m in models if m.can_access(asrt)]
-            if required_properties:
-                models = [
-                    m
-                    for m in models
-                    if all(getattr(m, rp, False) for rp in required_properties)
-                ]
+            batch: List[PKB] = []
+            cls.populate_models_from_pks(batch, pks, filter, detached)
+
+            # Check permissions on the new models and filter out unwanted ones.
+            models.extend(
+                m
+                for m in batch
+                if (asrt is None or m.can_access(asrt))
+                and all(getattr(m, rp, False) for rp in required_properties)
+            )
 
             # End pagination loop and return models.
             if limit is None or page or not extra_pks:
                 break
             pks = extra_pks[: abs(limit - len(models))]
             extra_pks = extra_pks[abs(limit - len(models)) :]
-        return list(models)
+        return models
 
     @classmethod
     def get_pks_of_many(
@@ -204,96 +341,137 @@ class PKBase(Model, BaseFunctionalityMixin):
         pks = cache.get(key) if key else None
         if not pks or not isinstance(pks, list):
             if expr_override is not None:
-                pks = [
-                    x[0] if len(x) == 1 else dict(x)
-                    for x in db.session.execute(expr_override)
-                ]
-            else:
-                primary_key = cls.get_primary_key()
-                if isinstance(primary_key, list):
-                    query = cls._construct_query(
-                        db.session.query(
-                            *(getattr(cls, k) for k in primary_key)
-                        ),
-                        filter,
-                        order,
-                    )
+                result = db.session.execute(expr_override)
+                # The row shape is fixed per query, so pick the unpacking once.
+                if len(result.keys()) == 1:
+                    pks = [x[0] for x in result]
                 else:
-                    query = cls._construct_query(
-                        db.session.query(getattr(cls, primary_key)),
-                        filter,
-                        order,
-                    )
+                    pks = [dict(x) for x in result]
+            else:
+                columns = cls._primary_key_columns()
+                query = cls._construct_query(
+                    db.session.query(*columns), filter, order
+                )
                 if not include_dead and cls.__deletion_attr__:
                     query = query.filter(
                         getattr(cls, cls.__deletion_attr__) == 'f'
                     )
-                pks = [
-                    x[0] if len(x) == 1 else x._asdict() for x in query.all()
-                ]
+                if len(columns) == 1:
+                    pks = [x[0] for x in query.all()]
+                else:
+                    pks = [x._asdict() for x in query.all()]
             if key:
                 cache.set(key, pks)
         return pks
 
+    @classmethod
+    def get_pks_after(
+        cls,
+        after: Union[int, str],
+        limit: int,
+        filter: BinaryExpression = None,
+        include_dead: bool = False,
+        reverse: bool = False,
+    ) -> List[Union[int, str]]:
+        """
+        Get one page of object IDs meeting query criteria with keyset pagination.
+        Only the IDs after the ``after`` cursor, in primary key order, are queried,
+        so the cost of a page doesn't grow with its depth. This is only meant to be
+        used for models with a single primary key. The pages are not cached.
+
+        :param after:        The primary key to return the IDs after
+        :param limit:        The number of IDs to return
+        :param filter:       A SQLAlchemy filter expression to be applied to the query
+        :param include_dead: Whether or not to include dead results in the IDs list
+        :param reverse:      Whether or not to page through the IDs in descending order
+
+        :return:             A list of IDs
+        """
+        column = cls._primary_key_columns()[0]
+        query = cls._construct_query(db.session.query(column), filter)
+        if not include_dead and cls.__deletion_attr__:
+            query = query.filter(getattr(cls, cls.__deletion_attr__) == 'f')
+        if reverse:
+            query = query.filter(column < after).order_by(column.desc())
+        else:
+            query = query.filter(column > after).order_by(column)
+        return [x[0] for x in query.limit(limit)]
+
     @classmethod
     def populate_models_from_pks(
         cls,
         models: List[PKB],
         pks: List[Union[str, int]],
         filter: BinaryExpression = None,
+        detached: bool = False,
     ) -> None:
         """
         Given a list of primary keys, fetch the objects corresponding to them from
         the cache and the database.
 
-        :param models:  A list of models to append new ones to
-        :param pks:     Primary keys of the objects to fetch
-        :param filter:  What to filter out from the query for the objects
+        :param models:   A list of models to append new ones to
+        :param pks:      Primary keys of the objects to fetch
+        :param filter:   What to filter out from the query for the objects
+        :param detached: Whether or not to leave models built from cached data
+                         detached from the session
         """
-        uncached_pks = []
-        cached_dict = cache.get_dict(*(cls.create_cache_key(pk) for pk in pks))
-        for i, (k, v) in zip(pks, cached_dict.items()):
-            if v:
-                models.append(cls._create_obj_from_cache(v))
-            else:
-                uncached_pks.append(i)
-
-        if uncached_pks:
-            if not isinstance(uncached_pks[0], dict):
-                qry_models: Dict[Union[int, str], PKB] = {
-                    obj.primary_key: obj
-                    for obj in cls._construct_query(
-                        cls.query.filter(
-                            getattr(cls, cls.get_primary_key()).in_(
-                                uncached_pks
-                            )
-                        ),
-                        filter,
-                    ).all()
-                }
+        # The cache lowercases keys, so the returned dict is keyed by the
+        # lowercased keys. Lookups go by key rather than by position, as
+        # duplicate PKs collapse into a single dict entry.
+        keys = [cls.create_cache_key(pk).lower() for pk in pks]
+        cached_dict = cache.get_dict(*keys)
+        # Models are kept in the order of ``pks``; uncached ones are left as
+        # ``None`` and filled in from the database below.
+        found: List[Optional[PKB]] = [
+            cls._create_obj_from_cache(cached_dict.get(key), detached)
+            for key in keys
+        ]
+        uncached_pks = [pk for pk, obj in zip(pks, found) if obj is None]
+
+        if not uncached_pks:
+            models.extend(found)  # type: ignore
+            return
+
+        if not isinstance(uncached_pks[0], dict):
+            get_pk = None
+            column = cls._primary_key_columns()[0]
+            if filter is None:
+                # Arbitrary filters can't key a baked query, so only the plain
+                # PK lookup skips building and compiling the query each time.
+                query = _bakery(
+                    lambda session: session.query(cls).filter(
+                        column.in_(bindparam('pks', expanding=True))
+                    ),
+                    cls,
+                )(db.session()).params(pks=uncached_pks)
             else:
-                uncached_pks_by_pk = defaultdict(list)
-                for pk in uncached_pks:
-                    for k, v in pk.items():
-                        uncached_pks_by_pk[k].append(v)
-                qry_models: Dict[Union[int, str], PKB] = {
-                    tuple(obj.primary_key.values()): obj
-                    for obj in cls._construct_query(
-                        cls.query.filter(
-                            and_(
-                                getattr(cls, k).in_(uncached_pks_by_pk[k])
-                                for k in uncached_pks_by_pk
-                            )
-                        ),
-                        filter,
-                    ).all()
-                }
-            cache.cache_models(qry_models.values())  # type: ignore
-            for pk in uncached_pks:
-                if isinstance(pk, dict):
-                    pk = tuple(pk.values())
-                if pk in qry_models:
-                    models.append(qry_models[pk])
+                query = cls._construct_query(
+                    cls.query.filter(column.in_(uncached_pks)), filter
+                )
+            qry_models: Dict[Any, PKB] = {
+                obj.primary_key: obj for obj in query.all()
+            }
+        else:
+            # Key both sides by the PK values in primary key column order;
+            # the order of the cached dicts' items is not guaranteed.
+            get_pk = itemgetter(*cls.get_primary_key())
+            qry_models = {
+                get_pk(obj.primary_key): obj
+                for obj in cls._construct_query(
+                    cls.query.filter(
+                        tuple_(*cls._primary_key_columns()).in_(
+                            [get_pk(pk) for pk in uncached_pks]
+                        )
+                    ),
+                    filter,
+                ).all()
+            }
+        cache.cache_models(qry_models.values())  # type: ignore
+        for pk, obj in zip(pks, found):
+            if obj is None:
+                obj = qry_models.get(get_pk(pk) if get_pk else pk)
+            if obj is not None:
+                models.append(obj)
 
     @staticmethod
     def _construct_query(
@@ -331,6 +509,30 @@ class PKBase(Model, BaseFunctionalityMixin):
             cache.cache_model(model)
         return model
 
+    @classmethod
+    def _new_many(cls: Type[PKB], rows: List[Dict[str, Any]]) -> List[PKB]:
+        """
+        Create multiple new instances of the model in a single commit, cache them,
+        and return them.
+
+        :param rows: A list of the new attributes of each model
+        :return:     The new models, in the order of ``rows``
+        """
+        models = [cls(**kwargs) for kwargs in rows]
+        db.session.add_all(models)
+        db.session.commit()
+        if cls.__cache_key__ and models:
+            # Reload the models expired by the commit in one query, rather than
+            # one query per model when their attributes are read for the cache.
+            columns = cls._primary_key_columns()
+            pks = [instance_state(m).identity for m in models]
+            if len(columns) == 1:
+                cls.query.filter(columns[0].in_([pk[0] for pk in pks])).all()
+            else:
+                cls.query.filter(tuple_(*columns).in_(pks)).all()
+            cache.cache_models(models)
+        return models
+
     @classmethod
     def count(
         cls,
@@ -342,7 +544,9 @@ class PKBase(Model, BaseFunctionalityMixin):
         """
         An abstracted function for counting a number of elements matching a query. If the
         passed cache key exists, its value will be returned; otherwise, the passed query
-        will be ran and the resultant count cached and returned.
+        will be ran and the resultant count cached and returned. Models which set
+        ``__approx_count__`` are counted from the planner's row estimate of their table
+        when no filter is passed, falling back to the query if the table has no estimate.
 
         :param key:       The cache key to check
         :param attribute: The attribute to count; a model's column
@@ -351,7 +555,17 @@ class PKBase(Model, BaseFunctionalityMixin):
         :return: The number of rows matching the query element
         """
         count = cache.get(key)
-        if not isinstance(count, int):
+        if count is None:
+            if filter is None and cls.__approx_count__:
+                count = db.session.execute(
+                    APPROX_COUNT_QUERY, {'table': cls.__tablename__}
+                ).scalar()
+                # Tables which have never been analyzed have no estimate: -1
+                # since PostgreSQL 14, 0 before it. An empty table is cheap to
+                # count exactly, so 0 is never trusted.
+                if count is not None and count > 0:
+                    cache.set(key, count, APPROX_COUNT_TIMEOUT)
+                    return count
             query = cls._construct_query(
                 db.session.query(func.count(attribute)), filter
             )
@@ -4,7 +4,7 @@ from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.declarative import declared_attr
 
-from core import APIException, db
+from core import APIException, cache, db
 from core.mixins.serializer import Attribute, Serializer
 from core.mixins.single_pk import SinglePKMixin
 
@@ -25,6 +25,7 @@ class ClassSerializer(Serializer):
 
 class ClassMixin(SinglePKMixin):
     __serializer__ = ClassSerializer
+    __cache_key_of_name__: Optional[str] = None
 
     id: int = db.Column(db.Integer, primary_key=True)
     name: str = db.Column(db.String(24), nullable=False)
@@ -45,13 +46,17 @@ class ClassMixin(SinglePKMixin):
     @classmethod
     def from_name(cls: Type[UC], name: str) -> Optional[UC]:
         """
-        Get a userclass object from its name.
+        Get a userclass object from its name. The ID of the userclass is cached
+        by its lowercased name, and the userclass is loaded from its own cache key.
 
         :param name: The name of the userclass
         :return:     The userclass
         """
         name = name.lower()
-        return cls.query.filter(func.lower(cls.name) == name).scalar()
+        return cls.from_query(
+            key=cls._cache_key_of_name(name),
+            filter=func.lower(cls.name) == name,
+        )
 
     @classmethod
     def new(cls: Type[UC], name: str, permissions: List[str] = None) -> UC:
@@ -66,8 +71,25 @@ class ClassMixin(SinglePKMixin):
             raise APIException(
                 f'Another {cls.__name__} already has the name {name}.'
             )
+        # The name may still point to the ID of a deleted userclass.
+        cache.delete(cls._cache_key_of_name(name.lower()))
         return super()._new(name=name, permissions=permissions or [])
 
+    @classmethod
+    def _cache_key_of_name(cls, name: str) -> str:
+        """
+        Get the cache key of a userclass's ID by its lowercased name. Subclasses
+        which do not set ``__cache_key_of_name__`` get a key built from their
+        table name.
+
+        :param name: The lowercased name of the userclass
+        :return:     The cache key
+        """
+        template = cls.__cache_key_of_name__ or (
+            f'{cls.__tablename__}_name_{{name}}'
+        )
+        return template.format(name=name)
+
     @classmethod
     def get_all(cls: Type[UC]) -> List[UC]:
         """
@@ -1,13 +1,14 @@
 from enum import Enum
 from typing import Any, List, Optional, Tuple, TypeVar, Union
 
-from sqlalchemy import and_
+from sqlalchemy import and_, bindparam
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.sql.elements import BinaryExpression
 
 from core import cache, db
-from core.mixins.base import PKBase
+from core.mixins.base import PKBase, _bakery
+from core.utils.memoization import cached_classmethod
 
 MPK = TypeVar('MPK', bound='MultiPKMixin')
 
@@ -21,14 +22,26 @@ class MultiPKMixin(PKBase):
     @classmethod
     def from_attrs(cls, **kwargs: Union[str, int]) -> Optional[MPK]:
         """
-        Get an instance of the model from its attributes.
+        Get an instance of the model from its attributes. Attributes passed as
+        ``None`` are compared with ``IS NULL``, as a bound ``None`` would never
+        match.
 
         :param kwargs: The attributes to query by
         :return:       An object matching the attributes
         """
-        query = cls.query.filter(
-            and_(*(getattr(cls, k) == v for k, v in kwargs.items()))
-        )
+        attrs = tuple(sorted(k for k, v in kwargs.items() if v is not None))
+        nulls = tuple(sorted(k for k, v in kwargs.items() if v is None))
+        query = _bakery(
+            lambda session: session.query(cls).filter(
+                and_(
+                    *(getattr(cls, k) == bindparam(k) for k in attrs),
+                    *(getattr(cls, k).is_(None) for k in nulls),
+                )
+            ),
+            cls,
+            attrs,
+            nulls,
+        )(db.session()).params(**{k: kwargs[k] for k in attrs})
         if cls.__cache_key__:
             return cls.from_cache(
                 key=cls.create_cache_key(kwargs), query=query
@@ -64,18 +77,16 @@ class MultiPKMixin(PKBase):
 
     @classmethod
     def create_cache_key(cls, attrs):
-        return cls.__cache_key__.format(
-            **{k: attrs[k] for k in cls.get_primary_key()}
-        )
+        return cls._cache_key_template() % attrs
 
-    @classmethod
-    def get_primary_key(cls) -> Tuple[str]:
+    @cached_classmethod
+    def get_primary_key(cls) -> Tuple[str, ...]:
         """
-        Get the name of the primary key attribute of the model.
+        Get the names of the primary key attributes of the model.
 
         :return: The primary key
         """
-        return [m.name for m in inspect(cls).primary_key]
+        return tuple(m.name for m in inspect(cls).primary_key)
 
     @property
     def primary_key(self):
@@ -70,11 +70,6 @@ class Attribute:
         initialization are valid, and whether or not the attribute meets nested
         requirements.
         """
-        has_permission = not self.permission or (
-            flask.g.user and flask.g.user.has_permission(self.permission)
-        )
-        has_self_access = self.self_access and obj.belongs_to_user()
-
         # `self.nested` is whether or not this attribute of /this/ object is serializable.
         # It will either be a tuple or a boolean. `nested` will also either be a tuple or
         # a boolean. If the parent object of this attribute was an attribute of its parent
@@ -83,12 +78,16 @@ class Attribute:
         # nested object, False if not.
         nested_bypass = self.nested or not nested
         nested_filter = isinstance(nested, tuple) and name not in nested
+        if not nested_bypass or nested_filter:
+            return False
 
-        return (
-            (has_permission or has_self_access)
-            and nested_bypass
-            and not nested_filter
-        )
+        # The cheap checks go first: ownership is only looked up for attributes
+        # the requesting user lacks the permission for.
+        if not self.permission or (
+            flask.g.user and flask.g.user.has_permission(self.permission)
+        ):
+            return True
+        return bool(self.self_access and obj.belongs_to_user())
 
 
 class Serializer(BaseFunctionalityMixin):
@@ -97,6 +96,10 @@ class Serializer(BaseFunctionalityMixin):
     TODO: More documentation.
     """
 
+    # Bumped whenever attributes are assigned to any serializer, which makes
+    # the attribute dictionaries stored on the serializer classes stale.
+    _attributes_version = 0
+
     @classmethod
     def serialize(cls, obj, nested=False):
         """
@@ -112,10 +115,26 @@ class Serializer(BaseFunctionalityMixin):
             return data
         return None
 
+    @classmethod
+    def assign_attrs(cls, **kwargs):
+        super().assign_attrs(**kwargs)
+        Serializer._attributes_version += 1
+
     @classmethod
     def attributes(cls) -> Dict[str, Attribute]:
-        """Get all non-method attributes of the object."""
-        attrs = inspect.getmembers(cls, lambda a: not inspect.isroutine(a))
-        return {
-            name: attr for name, attr in attrs if isinstance(attr, Attribute)
-        }
+        """
+        Get all non-method attributes of the object. Inspecting the class is slow
+        and is done for every serialized object, so the result is stored on the
+        class until attributes are assigned with ``assign_attrs``.
+        """
+        version, attributes = cls.__dict__.get('__attributes__', (None, None))
+        if version != Serializer._attributes_version:
+            attrs = inspect.getmembers(cls, lambda a: not inspect.isroutine(a))
+            version = Serializer._attributes_version
+            attributes = {
+                name: attr
+                for name, attr in attrs
+                if isinstance(attr, Attribute)
+            }
+            cls.__attributes__ = version, attributes
+        return attributes
@@ -1,12 +1,15 @@
+import warnings
 from enum import Enum
 from typing import Any, Dict, List, Optional, Type, TypeVar, Union
 
 import flask
+from sqlalchemy import bindparam, update as update_
 from sqlalchemy.inspection import inspect
 from sqlalchemy.sql.elements import BinaryExpression
 
 from core import APIException, _403Exception, _404Exception, cache, db
-from core.mixins.base import PKBase
+from core.mixins.base import PKBase, _bakery
+from core.utils.memoization import cached_classmethod
 
 SPK = TypeVar('SPK', bound='SinglePKMixin')
 
@@ -60,13 +63,16 @@ class SinglePKMixin(PKBase):
         if pk:
             model: SPK = cls.from_cache(
                 key=cls.create_cache_key(pk),
-                query=cls.query.filter(
-                    getattr(cls, cls.get_primary_key()) == pk
-                ),
+                query=_bakery(
+                    lambda session: session.query(cls).filter(
+                        cls._primary_key_columns()[0] == bindparam('pk')
+                    ),
+                    cls,
+                )(db.session()).params(pk=pk),
             )
             if (
                 model is not None
-                and model.can_access(asrt, error)
+                and (asrt is None or model.can_access(asrt, error))
                 and (
                     include_dead
                     or not cls.__deletion_attr__
@@ -117,38 +123,52 @@ class SinglePKMixin(PKBase):
     @classmethod
     def is_valid(cls, pk: Union[int, str, None], error: bool = False) -> bool:
         """
-        Check whether or not the object exists and isn't deleted.
+        Check whether or not the object exists and isn't deleted. The object is
+        checked against its cached data if present, otherwise with an ``EXISTS``
+        query; it is never loaded into a model.
 
         :param id:            The object ID to validate
         :param error:         Whether or not to raise an APIException on validation fail
         :return:              Validity of the object
         :raises APIException: If error param is passed and ID is not valid
         """
-        obj = cls.from_pk(pk)
-        if error and not obj:
+        valid = False
+        if pk:
+            data = cache.get(cls.create_cache_key(pk))
+            if cls._valid_data(data):
+                valid = not (
+                    cls.__deletion_attr__ and data[cls.__deletion_attr__]
+                )
+            else:
+                query = cls.query.filter(cls._primary_key_columns()[0] == pk)
+                if cls.__deletion_attr__:
+                    query = query.filter(
+                        getattr(cls, cls.__deletion_attr__) == 'f'
+                    )
+                valid = db.session.query(query.exists()).scalar()
+        if error and not valid:
             raise APIException(
                 f'Invalid {cls.__name__} {cls.get_primary_key()}.'
             )
-        return obj is not None
+        return valid
 
     @classmethod
     def create_cache_key(cls, pk: Union[int, str]) -> str:
         """
-        Populate the ``__cache_key__`` class attribute with the kwargs.
+        Populate the ``__cache_key__`` class attribute with the primary key.
 
-        :param kwargs:     The keywords that will be fed into the ``str.format`` function
+        :param pk:         The primary key of the object
 
         :return:           The cache key
         :raises NameError: If the cache key is undefined or improperly defined
         """
-        if cls.__cache_key__:
-            try:
-                return cls.__cache_key__.format(**{cls.get_primary_key(): pk})
-            except KeyError:
-                pass
-        raise NameError(  # pramga: no cover
-            'The cache key is undefined or improperly defined in this model.'
-        )
+        try:
+            return cls._cache_key_template() % {cls.get_primary_key(): pk}
+        except KeyError:
+            raise NameError(  # pramga: no cover
+                'The cache key is undefined or improperly defined in this '
+                'model.'
+            )
 
     @classmethod
     def update_many(
@@ -156,25 +176,42 @@ class SinglePKMixin(PKBase):
         *,
         pks: List[Union[str, int]],
         update: Dict[str, Any],
-        sychronize_session: bool = False,
+        sychronize_session: bool = None,
     ) -> None:
         """
         Construct and execute a query affecting all objects with PKs in the
         list of PKs passed to this function. This is only meant to be used for
-        models with an PK primary key and cache key formatted by PK.
+        models with an PK primary key and cache key formatted by PK. The PKs of
+        the updated rows are returned by the query, and only those objects are
+        removed from the cache. The commit after the query expires every
+        object loaded in the session, so updated objects are always reloaded.
 
-        :param pks:                 The list of primary key PKs to update
-        :param update:              The dictionary of column values to update
-        :param synchronize_session: Whether or not to update the session after
-                                    the query; should be True if the objects are
-                                    going to be used after updating
+        :param pks:                The list of primary key PKs to update
+        :param update:             The dictionary of column values to update
+        :param sychronize_session: Deprecated and ignored, as updated objects are
+                                   always reloaded
         """
+        if sychronize_session is not None:
+            warnings.warn(
+                'The sychronize_session argument of update_many is ignored.',
+                DeprecationWarning,
+                stacklevel=2,
+            )
         if pks:
-            db.session.query(cls).filter(
-                getattr(cls, cls.get_primary_key()).in_(pks)
-            ).update(update, synchronize_session=sychronize_session)
+            column = cls._primary_key_columns()[0]
+            matched = [
+                row[0]
+                for row in db.session.execute(
+                    update_(cls)
+                    .where(column.in_(pks))
+                    .values(update)
+                    .returning(column)
+                )
+            ]
+            if not matched:
+                return
             db.session.commit()
-            cache.delete_many(*(cls.create_cache_key(pk) for pk in pks))
+            cache.delete_many(*(cls.create_cache_key(pk) for pk in matched))
 
     def can_access(
         self, permission: Union[str, Enum] = None, error: bool = False
@@ -188,10 +225,11 @@ class SinglePKMixin(PKBase):
         :param permission: Permission to restrict access to
         :return:           Whether or not the requesting user can access the resource
         """
-        access = (
-            permission is None
-            or self.belongs_to_user()
-            or flask.g.user.has_permission(permission)
+        if permission is None:
+            return True
+        user = flask.g.user
+        access = user is not None and (
+            self.belongs_to_user() or user.has_permission(permission)
         )
         if error and not access:
             raise _403Exception
@@ -206,11 +244,21 @@ class SinglePKMixin(PKBase):
 
         :return: Whether or not the object "belongs" to the user
         """
-        return flask.g.user is not None and flask.g.user.id == getattr(
-            self, 'user_id', False
-        )
+        if not self._has_user_id():
+            return False
+        user = flask.g.user
+        return user is not None and user.id == self.user_id
 
-    @classmethod
+    @cached_classmethod
+    def _has_user_id(cls) -> bool:
+        """
+        Check whether or not the model has a ``user_id`` attribute.
+
+        :return: Whether or not the model has a ``user_id`` attribute
+        """
+        return hasattr(cls, 'user_id')
+
+    @cached_classmethod
     def get_primary_key(cls) -> str:
         """
         Get the name of the primary key attribute of the model.
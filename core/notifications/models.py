@@ -1,18 +1,38 @@
+import time
 from datetime import datetime
 from itertools import chain
-from typing import Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import flask
-from sqlalchemy import and_, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import and_, bindparam, func, update
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+from sqlalchemy.ext.declarative import declared_attr
 
 from core import APIException, cache, db
 from core.mixins import SinglePKMixin
+from core.mixins.base import _bakery
 from core.notifications.serializers import NotificationSerializer
 from core.users.models import User
 
 app = flask.current_app
 
+# The names of the notification types by ID. Types are never renamed, so the
+# names are kept for the lifetime of the process once they have been loaded.
+_TYPE_NAMES: Dict[int, str] = {}
+# The IDs of the notification types by name, kept for the same reason.
+_TYPE_IDS: Dict[str, int] = {}
+
+# The list and count cache key templates of the notification types by ID, with
+# only the user ID left to fill in.
+_KEY_TEMPLATES: Dict[int, Tuple[str, str]] = {}
+
+# All notification types as detached models, and when they were loaded. The
+# tuple is dropped whenever this process adds a type; types added by other
+# processes are picked up once it is older than ``ALL_TYPES_TIMEOUT`` seconds.
+ALL_TYPES_TIMEOUT = 60
+_ALL_TYPES: Tuple['NotificationType', ...] = ()
+_ALL_TYPES_LOADED = 0.0
+
 
 class Notification(db.Model, SinglePKMixin):
     __tablename__ = 'notifications'
@@ -42,42 +62,164 @@ class Notification(db.Model, SinglePKMixin):
         db.Boolean, nullable=False, server_default='f', index=True
     )
 
+    @declared_attr
+    def __table_args__(cls):
+        # Covers the per-type unread ID lists and counts of a user, which are
+        # filtered by user and type and ordered by ID.
+        return (
+            db.Index(
+                'ix_notifications_unread',
+                cls.user_id,
+                cls.type_id,
+                cls.id,
+                postgresql_where=~cls.read,
+            ),
+        )
+
     @property
-    def type(self):
-        return NotificationType.from_pk(self.type_id).type
+    def type(self) -> str:
+        try:
+            return _TYPE_NAMES[self.type_id]
+        except KeyError:
+            type = NotificationType.from_pk(self.type_id).type
+            _TYPE_NAMES[self.type_id] = type
+            return type
+
+    @classmethod
+    def cache_keys_of_type(
+        cls, user_id: int, type_id: int
+    ) -> Tuple[str, str]:
+        """
+        Get the cache keys of a user's notifications of a type. The templates are
+        formatted with the type ID once per process, so each call only has to
+        fill in the user ID.
+
+        :param user_id: The ID of the user
+        :param type_id: The ID of the notification type
+        :return:        The cache keys of the notification IDs and of the count
+        """
+        try:
+            pks_key, count_key = _KEY_TEMPLATES[type_id]
+        except KeyError:
+            pks_key, count_key = _KEY_TEMPLATES[type_id] = (
+                cls.__cache_key_of_user__.format(user_id='%s', type=type_id),
+                cls.__cache_key_notification_count__.format(
+                    user_id='%s', type=type_id
+                ),
+            )
+        return pks_key % user_id, count_key % user_id
 
     @classmethod
     def new(
         cls, user_id: int, type: str, contents: Dict[str, Union[Dict, str]]
     ) -> 'Notification':
         User.is_valid(user_id, error=True)
-        noti_type = NotificationType.from_type(type, create_new=True)
-        cache.delete(
-            cls.__cache_key_of_user__.format(user_id=user_id, type=type)
+        type_id = NotificationType.id_of_type(type, create_new=True)
+        noti = super()._new(
+            user_id=user_id, type_id=type_id, contents=contents
         )
-        cache.delete(
-            cls.__cache_key_notification_count__.format(
-                user_id=user_id, type=type
+        cache.delete_many(*cls.cache_keys_of_type(user_id, type_id))
+        return noti
+
+    @classmethod
+    def new_many(cls, items: List[Dict[str, Any]]) -> List['Notification']:
+        """
+        Create many notifications in one commit, such as when a notification is
+        sent to every subscriber of a thread. The cache keys of each user and
+        type are only cleared once, however many notifications they receive.
+
+        :param items: Dicts with the ``user_id``, ``type``, and ``contents`` of
+                      each notification
+        :return:      The new notifications, in the order of ``items``
+        """
+        for user_id in {item['user_id'] for item in items}:
+            User.is_valid(user_id, error=True)
+        rows = [
+            {
+                'user_id': item['user_id'],
+                'type_id': NotificationType.id_of_type(
+                    item['type'], create_new=True
+                ),
+                'contents': item['contents'],
+            }
+            for item in items
+        ]
+        notis = super()._new_many(rows)
+        cache.delete_many(
+            *chain.from_iterable(
+                cls.cache_keys_of_type(user_id, type_id)
+                for user_id, type_id in {
+                    (row['user_id'], row['type_id']) for row in rows
+                }
             )
         )
-        return super()._new(
-            user_id=user_id, type_id=noti_type.id, contents=contents
-        )
+        return notis
 
     @classmethod
     def get_all_unread(
         cls, user_id: int, limit: int = 25
     ) -> Dict[str, List['Notification']]:
-        return {
-            t.type: cls.get_many(
-                key=cls.__cache_key_of_user__.format(
-                    user_id=user_id, type=t.id
-                ),
-                filter=and_(cls.user_id == user_id, cls.type_id == t.id),
-                limit=limit,
-            )
-            for t in NotificationType.get_all()
+        types = NotificationType.get_all()
+        pks = cls.get_unread_pks_by_type(user_id, [t.id for t in types])
+        # Every type's notifications are loaded in one pass and then bucketed,
+        # rather than making a cache lookup and a query per type.
+        notis = cls.get_many(
+            pks=list(chain.from_iterable(p[:limit] for p in pks.values())),
+            limit=None,
+            detached=True,
+        )
+        by_type: Dict[int, List['Notification']] = {t.id: [] for t in types}
+        for noti in notis:
+            by_type[noti.type_id].append(noti)
+        return {t.type: by_type[t.id] for t in types}
+
+    @classmethod
+    def get_unread_pks_by_type(
+        cls, user_id: int, type_ids: List[int]
+    ) -> Dict[int, List[int]]:
+        """
+        Get the IDs of a user's unread notifications of multiple types. The
+        per-type cache keys are fetched at once, and the IDs of the uncached
+        types are selected with a single grouped query and then cached.
+
+        :param user_id:  The ID of the user
+        :param type_ids: The IDs of the notification types
+        :return:         A dictionary mapping type IDs to notification IDs,
+                         newest first
+        """
+        keys = {
+            type_id: cls.cache_keys_of_type(user_id, type_id)[0]
+            for type_id in type_ids
         }
+        cached = cache.get_dict(*keys.values())
+        pks = {}
+        for type_id, key in keys.items():
+            if isinstance(cached.get(key), list):
+                pks[type_id] = cached[key]
+        uncached = [type_id for type_id in type_ids if type_id not in pks]
+        if uncached:
+            fetched: Dict[int, List[int]] = {t: [] for t in uncached}
+            # Baked, as this runs on most notification views: only the user
+            # and the type IDs are bound on each call.
+            query = _bakery(
+                lambda session: session.query(
+                    cls.type_id,
+                    func.array_agg(aggregate_order_by(cls.id, cls.id.desc())),
+                )
+                .filter(
+                    cls.user_id == bindparam('user_id'),
+                    cls.type_id.in_(bindparam('type_ids', expanding=True)),
+                    cls.read == 'f',
+                )
+                .group_by(cls.type_id),
+                cls,
+            )
+            fetched.update(
+                query(db.session()).params(user_id=user_id, type_ids=uncached)
+            )
+            cache.set_many({keys[t]: pks_ for t, pks_ in fetched.items()})
+            pks.update(fetched)
+        return pks
 
     @classmethod
     def from_type(
@@ -87,77 +229,129 @@ class Notification(db.Model, SinglePKMixin):
         page: int = 1,
         limit: int = 50,
         include_read: bool = False,
+        after: int = None,
     ) -> List['Notification']:
-        noti_type = NotificationType.from_type(type, error=True)
+        """
+        Get a page of a user's notifications of a type, newest first.
+
+        :param user_id:       The ID of the user
+        :param type:          The notification type
+        :param page:          The page of notifications to get
+        :param limit:         The number of notifications per page
+        :param include_read:  Whether or not to include read notifications
+        :param after:         If passed, get the notifications older than this ID
+                              rather than a page
+        :return:              The notifications
+        :raises APIException: If the notification type doesn't exist
+        """
+        type_id = NotificationType.id_of_type(type, error=True)
         return cls.get_many(
-            key=cls.__cache_key_of_user__.format(
-                user_id=user_id, type=noti_type.id
-            ),
-            filter=and_(cls.user_id == user_id, cls.type_id == noti_type.id),
+            key=cls.cache_keys_of_type(user_id, type_id)[0],
+            filter=and_(cls.user_id == user_id, cls.type_id == type_id),
+            order=cls.id.desc(),
             page=page,
             limit=limit,
             include_dead=include_read,
+            detached=True,
+            # Keyset pages are walked in descending ID order to match.
+            reverse=after is not None,
+            after=after,
         )
 
     @classmethod
     def get_pks_from_type(
         cls, user_id: int, type: str, include_read: bool = False
     ):
-        noti_type = NotificationType.from_type(type)
         if type:
-            filter = and_(cls.user_id == user_id, cls.type_id == noti_type.id)
-            cache_key = cls.__cache_key_of_user__.format(
-                user_id=user_id, type=noti_type.id
-            )
+            type_id = NotificationType.id_of_type(type)
+            filter = and_(cls.user_id == user_id, cls.type_id == type_id)
+            cache_key = cls.cache_keys_of_type(user_id, type_id)[0]
         else:
             filter = cls.user_id == user_id
             cache_key = cls.__cache_key_of_user__.format(
                 user_id=user_id, type='all'
             )
 
+        # The per-type keys are shared with get_unread_pks_by_type, so they
+        # must be stored in the same newest-first order.
         return cls.get_pks_of_many(
-            key=cache_key, filter=filter, include_dead=include_read
+            key=cache_key,
+            filter=filter,
+            order=cls.id.desc(),
+            include_dead=include_read,
         )
 
+    @classmethod
+    def read_all(cls, user_id: int, type: str = None) -> None:
+        """
+        Mark all of a user's unread notifications as read; optionally only the
+        ones of a type. The notifications are updated with a single query, which
+        returns their IDs so that their cached copies can be removed.
+
+        :param user_id:       The ID of the user
+        :param type:          The notification type to limit the update to
+        :raises APIException: If the notification type doesn't exist
+        """
+        filter = and_(cls.user_id == user_id, ~cls.read)
+        if type:
+            type_id = NotificationType.id_of_type(type, error=True)
+            filter = and_(filter, cls.type_id == type_id)
+        pks = [
+            row[0]
+            for row in db.session.execute(
+                update(cls).where(filter).values(read=True).returning(cls.id)
+            )
+        ]
+        db.session.commit()
+        cache.delete_many(*(cls.create_cache_key(pk) for pk in pks))
+        cls.clear_cache_keys(user_id, type)
+
     @classmethod
     def get_notification_counts(cls, user_id: int) -> Dict[str, int]:
-        return {
-            t.type: cls.count(
-                key=cls.__cache_key_notification_count__.format(
-                    user_id=user_id, type=t
-                ),
-                attribute=cls.id,
-                filter=and_(
+        """
+        Get the number of unread notifications of every type for a user. The
+        per-type cache keys are fetched at once, and all the uncached counts
+        are selected with a single grouped query and then cached.
+
+        :param user_id: The ID of the user
+        :return:        A dictionary mapping type names to unread counts
+        """
+        types = NotificationType.get_all()
+        keys = {t.id: cls.cache_keys_of_type(user_id, t.id)[1] for t in types}
+        cached = cache.get_dict(*keys.values())
+        counts = {
+            type_id: cached[key]
+            for type_id, key in keys.items()
+            if cached.get(key) is not None
+        }
+        uncached = [t.id for t in types if t.id not in counts]
+        if uncached:
+            fetched: Dict[int, int] = {type_id: 0 for type_id in uncached}
+            fetched.update(
+                db.session.query(cls.type_id, func.count(cls.id))
+                .filter(
                     cls.user_id == user_id,
-                    cls.type_id == t.id,
+                    cls.type_id.in_(uncached),
                     cls.read == 'f',
-                ),
+                )
+                .group_by(cls.type_id)
             )
-            for t in NotificationType.get_all()
-        }
+            cache.set_many({keys[t]: count for t, count in fetched.items()})
+            counts.update(fetched)
+        return {t.type: counts[t.id] for t in types}
 
     @classmethod
     def clear_cache_keys(cls, user_id: int, type=None) -> None:
-        types = (
-            [NotificationType.from_type(type, error=True)]
+        type_ids = (
+            [NotificationType.id_of_type(type, error=True)]
             if type
-            else NotificationType.get_all()
+            else [t.id for t in NotificationType.get_all()]
         )
         cache.delete_many(
-            *chain(
-                *chain(
-                    [
-                        (
-                            cls.__cache_key_notification_count__.format(
-                                user_id=user_id, type=t.id
-                            ),
-                            cls.__cache_key_of_user__.format(
-                                user_id=user_id, type=t.id
-                            ),
-                        )
-                        for t in types
-                    ]
-                )
+            *(
+                key
+                for type_id in type_ids
+                for key in cls.cache_keys_of_type(user_id, type_id)
             )
         )
 
@@ -198,13 +392,63 @@ class NotificationType(db.Model, SinglePKMixin):
             raise APIException(f'{type} is not a notification type.')
         return None
 
+    @classmethod
+    def id_of_type(
+        cls, type: str, *, create_new: bool = False, error: bool = False
+    ) -> Optional[int]:
+        """
+        Get the ID of a notification type from its name. Types are never renamed,
+        so the IDs are kept in the process once they have been looked up.
+
+        :param type:          The notification type
+        :param create_new:    Whether or not to create a new type with the given str
+        :param error:         Whether or not to error if the type doesn't exist
+
+        :return:              The ID of the notification type
+        :raises APIException: If error kwarg is passed and type doesn't exist
+        """
+        try:
+            return _TYPE_IDS[type]
+        except KeyError:
+            noti_type = cls.from_type(type, create_new=create_new, error=error)
+            if noti_type is None:
+                return None
+            _TYPE_IDS[type] = noti_type.id
+            _TYPE_NAMES[noti_type.id] = type
+            return noti_type.id
+
+    @classmethod
+    def _new(cls, **kwargs: Any) -> 'NotificationType':
+        global _ALL_TYPES
+        noti_type = super()._new(**kwargs)
+        cache.delete(cls.__cache_key_all__)
+        _ALL_TYPES = ()
+        return noti_type
+
     @classmethod
     def get_all(cls) -> List['NotificationType']:
         """
-        Get all notification types in the database.
+        Get all notification types in the database. Types are nearly static, so
+        they are kept in the process and only looked up again once they've been
+        invalidated or have timed out.
 
         :return: All notification type objects
         """
-        return cls.get_many(
-            key=cls.__cache_key_all__, order=cls.id, limit=None
-        )
+        global _ALL_TYPES, _ALL_TYPES_LOADED
+        now = time.monotonic()
+        if not _ALL_TYPES or now - _ALL_TYPES_LOADED > ALL_TYPES_TIMEOUT:
+            types = cls.get_many(
+                key=cls.__cache_key_all__, order=cls.id, limit=None
+            )
+            # Keep detached copies, which a session commit can't expire.
+            _ALL_TYPES = tuple(
+                cls._create_obj_from_cache(
+                    {k: getattr(t, k) for k in cls._column_keys()},
+                    detached=True,
+                )
+                for t in types
+            )
+            _ALL_TYPES_LOADED = now
+            _TYPE_NAMES.update((t.id, t.type) for t in types)
+            _TYPE_IDS.update((t.type, t.id) for t in types)
+        return list(_ALL_TYPES)
@@ -1,10 +1,11 @@
 import flask
-from voluptuous import All, In, Range, Schema
+from voluptuous import All, Coerce, In, Range, Schema
 
 from core import APIException, db
 from core.notifications.models import Notification
 from core.notifications.permissions import NotificationPermissions
 from core.users.models import User
+from core.users.permissions import SitePermissions
 from core.utils import access_other_user, require_permission, validate_data
 from core.validators import BoolGET
 
@@ -44,16 +45,28 @@ def view_notifications(user: User):
     :>json dict response: A dictionary of notification types and lists of notifications
 
     :statuscode 200: Successfully viewed notifications.
+    :statuscode 304: The notifications have not changed since the ``ETag`` sent.
+                     Not sent to users who can view the cache keys.
     :statuscode 403: User does not have access to view notifications.
     """
-    return flask.jsonify(Notification.get_all_unread(user.id))
+    response = flask.jsonify(Notification.get_all_unread(user.id))
+    # Clients poll this view, so an unchanged response is answered with a 304.
+    # This only saves sending the body again: the ETag hashes the serialized
+    # notifications, so they are still loaded. Responses with the requester's
+    # cache keys appended change on every request and are never conditional.
+    if not flask.g.user.has_permission(SitePermissions.MANAGE_CACHE_KEYS):
+        response.add_etag(weak=True)
+        response = response.make_conditional(flask.request)
+    return response
 
 
 VIEW_NOTIFICATION_SCHEMA = Schema(
     {
-        'page': All(int, Range(min=0, max=2147483648)),
-        'limit': All(int, In((25, 50, 100))),
+        # Query string values arrive as strings, so the numbers are coerced.
+        'page': All(Coerce(int), Range(min=1, max=2147483648)),
+        'limit': All(Coerce(int), In((25, 50, 100))),
         'include_read': BoolGET,
+        'after': All(Coerce(int), Range(min=0, max=2147483648)),
     }
 )
 
@@ -68,6 +81,7 @@ def view_notification_type(
     page: int = 1,
     limit: int = 50,
     include_read: bool = False,
+    after: int = None,
 ):
     """
     View all pending notifications of a specific type. Requires the
@@ -100,6 +114,12 @@ def view_notification_type(
          ]
        }
 
+    :query int page:             The page of notifications to view, newest first
+    :query int limit:            The number of notifications per page (25, 50 or 100)
+    :query boolean include_read: Whether or not to include read notifications
+    :query int after:            View the ``limit`` notifications older than this
+                                 notification ID, instead of a page
+
     :>json dict response: A list of notifications
 
     :statuscode 200: Successfully viewed notifications.
@@ -107,7 +127,14 @@ def view_notification_type(
     :statuscode 403: User does not have access to view notifications.
     """
     return flask.jsonify(
-        Notification.from_type(user.id, type, include_read=include_read)
+        Notification.from_type(
+            user.id,
+            type,
+            page=page,
+            limit=limit,
+            include_read=include_read,
+            after=after,
+        )
     )
 
 
@@ -143,11 +170,7 @@ def clear_notifications(read: bool, user: User, type: str = None):
     """
     if not read:
         raise APIException('You cannot set all notifications to unread.')
-    Notification.update_many(
-        pks=Notification.get_pks_from_type(user.id, type, include_read=False),
-        update={'read': True},
-    )
-    Notification.clear_cache_keys(user.id)
+    Notification.read_all(user.id, type)
     return flask.jsonify(
         f'{"All" if not type else type} notifications cleared.'
     )
@@ -1,6 +1,16 @@
+import re
 from enum import Enum
-from itertools import chain
-from typing import List
+from functools import lru_cache
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 import flask
 
@@ -16,31 +26,83 @@ class PermissionsEnum(Enum):
 
 
 class Permissions:
-    _core_permissions_loaded = False
-    permission_regexes: dict = {'basic': [], 'full': []}
+    all_permissions: Optional[Tuple[str, ...]] = None
+    # The same permissions as ``all_permissions``, for membership checks.
+    all_permissions_set: FrozenSet[str] = frozenset()
+    # Compiled when registered, and rebuilt rather than mutated, so that the
+    # regexes are only ever iterated as flat tuples.
+    permission_regexes: Dict[str, Tuple[Pattern, ...]] = {
+        'basic': (),
+        'full': (),
+    }
+    all_permission_regexes: Tuple[Pattern, ...] = ()
 
     @classmethod
     def is_valid_permission(
         cls, permission: str, permissioned: bool = True
     ) -> bool:
         if permissioned:
-            if permission in cls.get_all_permissions():
+            if cls.all_permissions is None:
+                cls.get_all_permissions()
+            if permission in cls.all_permissions_set:
                 return True
-            return any(
-                r.match(permission)
-                for r in chain(*cls.permission_regexes.values())
-            )
-        if permission in app.config['BASIC_PERMISSIONS']:
+        elif permission in app.config['BASIC_PERMISSIONS']:
             return True
-        return any(
-            r.match(permission) for r in cls.permission_regexes['basic']
+        return cls._regex_match(permission, permissioned)
+
+    @classmethod
+    def add_permission_regexes(
+        cls,
+        basic: Iterable[Union[str, Pattern]] = (),
+        full: Iterable[Union[str, Pattern]] = (),
+    ) -> None:
+        """
+        Register regexes matching permissions that are not defined in enums,
+        such as per-forum permissions, and forget the memoized matches.
+
+        :param basic: Regexes of permissions that can be basic permissions
+        :param full:  Regexes of permissions that can only be full permissions
+        """
+        regexes = {
+            'basic': cls.permission_regexes['basic']
+            + tuple(re.compile(r) for r in basic),
+            'full': cls.permission_regexes['full']
+            + tuple(re.compile(r) for r in full),
+        }
+        cls.permission_regexes = regexes
+        cls.all_permission_regexes = regexes['basic'] + regexes['full']
+        cls._regex_match.cache_clear()
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _regex_match(permission: str, permissioned: bool) -> bool:
+        """
+        Check a permission against the permission regexes. The permissions checked
+        come from a small set of names, so the results are memoized.
+
+        :param permission:   The permission to check
+        :param permissioned: Whether or not to check the full permission regexes
+        :return:             Whether or not any of the regexes match
+        """
+        regexes = (
+            Permissions.all_permission_regexes
+            if permissioned
+            else Permissions.permission_regexes['basic']
         )
+        return any(r.match(permission) for r in regexes)
 
     @classmethod
-    def get_all_permissions(cls):
-        if not cls._core_permissions_loaded:
-            cls.all_permissions = cls._get_all_permissions()
-            cls._core_permissions_loaded = True
+    def get_all_permissions(cls) -> Tuple[str, ...]:
+        """
+        Get all the permissions defined in permission enum subclasses. The
+        subclasses are fixed once the app has loaded, so the permissions are only
+        aggregated on the first call, into a tuple so callers can't modify them.
+
+        :return: The tuple of permissions
+        """
+        if cls.all_permissions is None:
+            cls.all_permissions = tuple(cls._get_all_permissions())
+            cls.all_permissions_set = frozenset(cls.all_permissions)
         return cls.all_permissions
 
     @staticmethod
@@ -52,8 +114,4 @@ class Permissions:
 
         :return: The list of permissions
         """
-        return list(
-            chain(
-                [e.value for c in PermissionsEnum.__subclasses__() for e in c]
-            )
-        )
+        return [e.value for c in PermissionsEnum.__subclasses__() for e in c]
@@ -1,7 +1,7 @@
 from typing import Dict, List
 
 import flask
-from sqlalchemy import select
+from sqlalchemy import exists, select
 
 from core import db
 from core.mixins import ClassMixin, MultiPKMixin
@@ -14,15 +14,19 @@ class UserClass(db.Model, ClassMixin):
     __tablename__ = 'user_classes'
     __cache_key__ = 'user_class_{id}'
     __cache_key_all__ = 'user_classes'
+    __cache_key_of_name__ = 'user_class_name_{name}'
 
     def has_users(self) -> bool:
-        return bool(User.query.filter(User.user_class_id == self.id).first())
+        return db.session.query(
+            exists().where(User.user_class_id == self.id)
+        ).scalar()
 
 
 class SecondaryClass(db.Model, ClassMixin):
     __tablename__ = 'secondary_classes'
     __cache_key__ = 'secondary_class_{id}'
     __cache_key_all__ = 'secondary_classes'
+    __cache_key_of_name__ = 'secondary_class_name_{name}'
     __cache_key_of_user__ = 'secondary_classes_users_{id}'
 
     @classmethod
@@ -35,15 +39,11 @@ class SecondaryClass(db.Model, ClassMixin):
         )
 
     def has_users(self) -> bool:
-        return bool(
-            db.session.execute(
-                select([secondary_class_assoc_table.c.user_id])
-                .where(
-                    secondary_class_assoc_table.c.secondary_class_id == self.id
-                )
-                .limit(1)
+        return db.session.query(
+            exists().where(
+                secondary_class_assoc_table.c.secondary_class_id == self.id
             )
-        )
+        ).scalar()
 
 
 secondary_class_assoc_table = db.Table(
@@ -80,13 +80,14 @@ class UserPermission(db.Model, MultiPKMixin):
         Gets a dict of all custom permissions assigned to a user.
 
         :param user_id: User ID the permissions belong to
+        :param prefix:  Only get the permissions starting with this prefix
         :return:        Dict of permissions with the name as the
                         key and the ``granted`` value as the value
         """
-        return {
-            p.permission: p.granted
-            for p in cls.query.filter(  # type: ignore
-                cls.user_id == user_id
-            ).all()
-            if not prefix or p.permission.startswith(prefix)
-        }
+        query = cls.query.filter(cls.user_id == user_id)  # type: ignore
+        if prefix:
+            # Escaped, as permission names contain LIKE wildcards (``_``).
+            query = query.filter(
+                cls.permission.startswith(prefix, autoescape=True)
+            )
+        return {p.permission: p.granted for p in query.all()}
@@ -26,21 +26,30 @@ HASHED_CODE_4 = generate_password_hash(CODE_4)
 class CorePopulator(TestDataPopulator):
     @classmethod
     def populate(cls):
-        UserClass.new(name='User')
-        UserClass.new(
-            name='Power User',
-            permissions=['permissions_modify', 'users_edit_settings'],
+        UserClass._new_many(
+            [
+                {'name': 'User'},
+                {
+                    'name': 'Power User',
+                    'permissions': [
+                        'permissions_modify',
+                        'users_edit_settings',
+                    ],
+                },
+                {'name': 'Elite'},
+                {'name': 'Torrent Masturbaiter'},
+                {'name': 'Staff'},
+                {'name': 'Administrator'},
+            ]
         )
-        UserClass.new(name='Elite')
-        UserClass.new(name='Torrent Masturbaiter')
-        UserClass.new(name='Staff')
-        UserClass.new(name='Administrator')
-        SecondaryClass.new(name='FLS')
-        SecondaryClass.new(
-            name='Beans Team', permissions=['users_edit_settings']
+        SecondaryClass._new_many(
+            [
+                {'name': 'FLS'},
+                {'name': 'Beans Team', 'permissions': ['users_edit_settings']},
+                {'name': 'Progressive Insurance'},
+                {'name': 'Jake from State Farom'},
+            ]
         )
-        SecondaryClass.new(name='Progressive Insurance')
-        SecondaryClass.new(name='Jake from State Farom')
 
         db.engine.execute(  # Generating password hash each time is slow, so raw SQL we go.
             f"""INSERT INTO users
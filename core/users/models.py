@@ -26,6 +26,9 @@ if TYPE_CHECKING:
 
 app = flask.current_app
 
+# Resolved once, as it is checked on every permission check.
+_GOD_MODE: str = SitePermissions.GOD_MODE.value
+
 
 class User(db.Model, SinglePKMixin):
     __tablename__ = 'users'
@@ -165,7 +168,7 @@ class User(db.Model, SinglePKMixin):
 
     def has_permission(self, permission: Union[None, str, Enum]) -> bool:
         """Check whether a user has a permission."""
-        if SitePermissions.GOD_MODE.value in self.permissions:
+        if _GOD_MODE in self.permissions:
             return True
         p = permission.value if isinstance(permission, Enum) else permission
         return bool(p and p in self.permissions)
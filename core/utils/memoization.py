@@ -20,3 +20,23 @@ def cached_property(func: Callable) -> property:
         return rv
 
     return property(wrapper)
+
+
+def cached_classmethod(func: Callable) -> classmethod:
+    """
+    A decorator that caches the result of an argumentless classmethod on the
+    class it is called on. Meant for values derived from a model's mapping,
+    which do not change at runtime. Each subclass computes its own value.
+    """
+    name = f'_{func.__name__}_cache'
+
+    @wraps(func)
+    def wrapper(cls):
+        try:
+            return cls.__dict__[name]
+        except KeyError:
+            rv = func(cls)
+            setattr(cls, name, rv)
+            return rv
+
+    return classmethod(wrapper)
@@ -50,4 +50,5 @@ setup(
         'redis',
         'voluptuous',
     ],
+    extras_require={'speedups': ['orjson']},
 )
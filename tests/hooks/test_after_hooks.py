@@ -1,3 +1,5 @@
+import json
+
 import flask
 import pytest
 
@@ -66,3 +68,28 @@ def test_response_no_json(app, authed_client):
 
     response = authed_client.get('/test_endpoint')
     assert response.get_data() == b'<html><body><h1>HELLO</h1></body></html>'
+
+
+def test_response_json_not_reencoded(app, authed_client):
+    """The original JSON body should be embedded as-is in the wrapper."""
+
+    @app.route('/test_endpoint')
+    def test_endpoint():
+        return flask.Response(
+            '{"b": 1, "a": [1, 2]}', mimetype='application/json'
+        )
+
+    response = authed_client.get('/test_endpoint')
+    assert response.get_data() == (
+        b'{"status": "success", "response": {"b": 1, "a": [1, 2]}}'
+    )
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dump_cache_keys(monkeypatch, use_orjson):
+    from core.hooks import after
+
+    if not use_orjson:
+        monkeypatch.setattr(after, 'orjson', None)
+    data = json.loads(after.dump_cache_keys({'get': {'key_1'}, 'set': set()}))
+    assert data == {'get': ['key_1'], 'set': []}
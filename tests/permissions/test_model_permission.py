@@ -1,3 +1,5 @@
+import re
+
 from conftest import add_permissions
 from core import db
 from core.permissions.models import UserPermission
@@ -20,6 +22,11 @@ def test_permissions_from_user(app, client):
     }
 
 
+def test_permissions_from_user_prefix(app, client):
+    add_permissions(app, 'perm_one', 'permxone', 'other_perm')
+    assert UserPermission.from_user(1, prefix='perm_') == {'perm_one': True}
+
+
 def test_site_god_mode_override(app, authed_client):
     add_permissions(app, 'site_god_mode')
     assert User.from_pk(1).has_permission('really_not_existent_permission')
@@ -48,3 +55,55 @@ def test_user_class_permission_override(app, authed_client):
         'userclasses_modify',
         'userclasses_list',
     }
+
+
+def test_get_all_permissions_memoized(app, client):
+    from core.permissions import Permissions
+
+    permissions = Permissions.get_all_permissions()
+    assert 'permissions_modify' in permissions
+    assert 'notifications_view' in permissions
+    assert Permissions.get_all_permissions() is permissions
+    assert isinstance(permissions, tuple)
+    assert Permissions.all_permissions_set == frozenset(permissions)
+
+
+def test_is_valid_permission(app, client, monkeypatch):
+    from core.permissions import Permissions
+
+    monkeypatch.setattr(Permissions, 'all_permissions', None)
+    monkeypatch.setattr(
+        Permissions, 'permission_regexes', {'basic': (), 'full': ()}
+    )
+    monkeypatch.setattr(Permissions, 'all_permission_regexes', ())
+    assert not Permissions.is_valid_permission('forums_view_5')
+    Permissions.add_permission_regexes(basic=[re.compile('forums_view_.+')])
+    assert Permissions.is_valid_permission('permissions_modify')
+    assert 'permissions_modify' in Permissions.all_permissions_set
+    assert Permissions.is_valid_permission('forums_view_5')
+    assert Permissions.is_valid_permission('forums_view_5', False)
+    assert Permissions.is_valid_permission('invites_send', False)
+    assert not Permissions.is_valid_permission('permissions_modify', False)
+    assert not Permissions.is_valid_permission('not_a_permission')
+    Permissions._regex_match.cache_clear()
+
+
+def test_is_valid_permission_memoized(app, client, monkeypatch):
+    from core.permissions import Permissions
+
+    monkeypatch.setattr(
+        Permissions, 'permission_regexes', {'basic': (), 'full': ()}
+    )
+    monkeypatch.setattr(Permissions, 'all_permission_regexes', ())
+    Permissions.add_permission_regexes(full=['torrents_.+'])
+    assert Permissions.permission_regexes['full'] == (
+        re.compile('torrents_.+'),
+    )
+    assert Permissions.is_valid_permission('torrents_5')
+    monkeypatch.setattr(
+        Permissions, 'permission_regexes', {'basic': (), 'full': ()}
+    )
+    monkeypatch.setattr(Permissions, 'all_permission_regexes', ())
+    assert Permissions.is_valid_permission('torrents_5')
+    Permissions.add_permission_regexes()
+    assert not Permissions.is_valid_permission('torrents_5')
@@ -3,7 +3,7 @@ import json
 import pytest
 
 from conftest import check_json_response
-from core import db
+from core import cache, db
 from core.permissions.models import SecondaryClass, UserClass
 
 
@@ -144,6 +144,28 @@ def test_delete_user_class(app, authed_client):
     assert not UserClass.from_name('Power User')
 
 
+def test_user_class_from_name_cached(app, authed_client):
+    user_class = UserClass.from_name('Power User')
+    assert cache.get('user_class_name_power user') == user_class.id
+    assert UserClass.from_name('POWER USER').id == user_class.id
+
+
+def test_user_class_from_name_default_cache_key(
+    app, authed_client, monkeypatch
+):
+    monkeypatch.setattr(UserClass, '__cache_key_of_name__', None)
+    user_class = UserClass.from_name('Power User')
+    assert cache.get('user_classes_name_power user') == user_class.id
+
+
+def test_recreate_deleted_user_class(app, authed_client):
+    UserClass.from_name('Power User')
+    authed_client.delete('/user_classes/2')
+    assert not UserClass.from_name('Power User')
+    user_class = UserClass.new(name='Power User')
+    assert UserClass.from_name('Power User').id == user_class.id
+
+
 def test_delete_user_class_nonexistent(app, authed_client):
     response = authed_client.delete('/user_classes/10').get_json()
     assert response['response'] == 'UserClass 10 does not exist.'
@@ -176,6 +198,23 @@ def test_delete_secondary_class_with_user(app, authed_client):
     assert SecondaryClass.from_pk(1)
 
 
+def test_delete_secondary_class_without_users(app, authed_client):
+    response = authed_client.delete(
+        '/user_classes/2', query_string={'secondary': True}
+    ).get_json()
+    assert (
+        response['response'] == 'SecondaryClass Beans Team has been deleted.'
+    )
+    assert not SecondaryClass.from_pk(2)
+
+
+def test_has_users(app, authed_client):
+    assert UserClass.from_pk(1).has_users() is True
+    assert UserClass.from_pk(3).has_users() is False
+    assert SecondaryClass.from_pk(1).has_users() is True
+    assert SecondaryClass.from_pk(2).has_users() is False
+
+
 def test_modify_user_class(app, authed_client):
     response = authed_client.put(
         '/user_classes/1',
@@ -1,3 +1,5 @@
+import sys
+
 import flask
 
 from conftest import add_permissions
@@ -29,6 +31,25 @@ def test_cache_model(app, authed_client):
     assert user_data['inviter_id'] is None
 
 
+def test_cache_models_single_round_trip(app, client, monkeypatch):
+    """Caching several models should flush them in one pipeline."""
+    users = [User.from_pk(1), User.from_pk(2)]
+    cache.delete_many('users_1', 'users_2')
+    writes = []
+    set_many = cache.set_many
+    monkeypatch.setattr(cache, 'set', None)
+    monkeypatch.setattr(
+        cache,
+        'set_many',
+        lambda mapping, timeout=None: writes.append(mapping)
+        or set_many(mapping, timeout),
+    )
+    cache.cache_models(users)
+    cache.cache_models([])
+    assert len(writes) == 1
+    assert cache.get('users_2')['username'] == 'user_two'
+
+
 def test_cache_model_when_none(app, client, monkeypatch):
     """Assert caching a None object returns None."""
     assert cache.cache_model(None, timeout=60) is None
@@ -60,6 +81,18 @@ def test_cache_inc_key_new(app, client):
     assert time_left < 61
 
 
+def test_cache_inc_existing_key_new(app, client):
+    """Incrementing a nonexistent key with inc_existing should not create it."""
+    assert cache.inc_existing('test-inc-key', 2) is None
+    assert not cache.has('test-inc-key')
+
+
+def test_cache_inc_existing_key_already_exists(app, client):
+    assert cache.set('TEST-inc-key', 3, timeout=15)
+    assert cache.inc_existing('test-INC-key', 4) == 7
+    assert cache.ttl('test-inc-key') > 13
+
+
 def test_cache_inc_key_already_exists(app, client):
     """Incrementing an already-existing key just increments it."""
     assert cache.set('test-inc-key', 3, timeout=15)
@@ -148,6 +181,18 @@ def test_cache_delete_many(app, client):
         assert 'key_3' in flask.g.cache_keys['delete_many']
 
 
+def test_cache_delete_many_batches(app, client, monkeypatch):
+    """Keys beyond one batch are still deleted in the same call."""
+    monkeypatch.setattr(sys.modules['core.cache'], 'DELETE_BATCH_SIZE', 2)
+    cache.set_many({f'key_{i}': i for i in range(5)})
+    assert cache.delete_many(*(f'KEY_{i}' for i in range(5)))
+    assert not any(cache.has(f'key_{i}') for i in range(5))
+
+
+def test_cache_delete_many_empty(app, client):
+    assert not cache.delete_many()
+
+
 def test_cache_sets_globals(app, authed_client):
     """Modifying cache values should add them to the global variables."""
 
@@ -0,0 +1,48 @@
+import sys
+
+from core import cached_import, db
+
+
+def test_cached_import_from_sys_modules(monkeypatch):
+    """Already-imported modules should be pulled from sys.modules."""
+    sentinel = object()
+    monkeypatch.setitem(sys.modules, 'core.fake_module', sentinel)
+    assert cached_import('core.fake_module') is sentinel
+
+
+def test_cached_import_new_module(monkeypatch, request, tmp_path):
+    """Modules not yet imported should be imported normally."""
+    (tmp_path / 'cached_import_module.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    request.addfinalizer(lambda: sys.modules.pop('cached_import_module', None))
+    module = cached_import('cached_import_module')
+    assert module.__name__ == 'cached_import_module'
+    assert sys.modules['cached_import_module'] is module
+
+
+def test_blueprint_manifest(app):
+    """Every registered blueprint should come from the manifest."""
+    from core import _blueprint_manifest
+
+    manifest = _blueprint_manifest()
+    assert 'core.users' in manifest
+    assert 'core.notifications' in manifest
+    assert 'core.mixins' not in manifest
+    assert not any(name.endswith('conftest') for name in manifest)
+    assert {'users', 'notifications', 'permissions', 'hooks'} <= set(
+        app.blueprints
+    )
+
+
+def test_engine_uses_lifo_pool(app, client):
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_use_lifo'] is True
+    first, second = db.engine.raw_connection(), db.engine.raw_connection()
+    last_returned = second.connection
+    first.close()
+    second.close()
+    # The most recently returned connection is the next one checked out.
+    again = db.engine.raw_connection()
+    try:
+        assert again.connection is last_returned
+    finally:
+        again.close()
@@ -1,7 +1,19 @@
+import sys
+
 import pytest
+from sqlalchemy import inspect, text
 
-from core.mixins import SinglePKMixin
-from core.permissions.models import UserClass
+from core import APIException, _403Exception, cache, db
+from core.mixins import (
+    Attribute,
+    ClassSerializer,
+    SinglePKMixin,
+    TestDataPopulator,
+)
+from core.mixins.base import _bakery
+from core.permissions.models import UserClass, UserPermission
+from core.users.models import APIKey
+from core.users.permissions import SitePermissions
 
 
 def test_belongs_to_user_fails_authed(app, authed_client):
@@ -19,6 +31,22 @@ def test_belongs_to_user_fails_unauthed(app, client):
         assert not mixin.belongs_to_user()
 
 
+def test_belongs_to_user_with_user_id(app, authed_client):
+    with app.test_request_context('/test'):
+        assert APIKey.from_pk('abcdefghij').belongs_to_user()
+        assert not APIKey.from_pk('bcdefghijk').belongs_to_user()
+    assert APIKey._has_user_id() and not UserClass._has_user_id()
+
+
+def test_can_access_unauthed(app, client):
+    with app.test_request_context('/test'):
+        api_key = APIKey.from_pk('abcdefghij')
+        assert api_key.can_access()
+        assert not api_key.can_access('users_view')
+        with pytest.raises(_403Exception):
+            api_key.can_access('users_view', error=True)
+
+
 def test_delet_unavailable_property_from_cache_doesnt_blow_up(
     app, authed_client
 ):
@@ -46,3 +74,309 @@ def test_delet_unavailable_property_from_cache_doesnt_blow_up(
 def test_is_valid_data(app, client, data, result):
     """Make sure the post-cache fetch function for valid data works."""
     assert UserClass._valid_data(data) is result
+
+
+def test_populate_models_invalid_cache_data(app, client):
+    """Invalid cached data should fall back to the database, not yield None."""
+    cache.set(UserClass.create_cache_key(1), {'id': 1, 'name': 'User'})
+    models = []
+    UserClass.populate_models_from_pks(models, [1, 2])
+    assert [m.id for m in models] == [1, 2]
+
+
+def test_populate_models_duplicate_pks(app, client):
+    """Duplicate PKs should not misalign the cached values with the PKs."""
+    UserClass.from_pk(2)
+    models = []
+    UserClass.populate_models_from_pks(models, [2, 2, 3])
+    assert [m.id for m in models] == [2, 2, 3]
+
+
+def test_populate_models_preserves_order(app, client):
+    """Cached and uncached models should be returned in the order of the PKs."""
+    UserClass.from_pk(3)
+    models = []
+    UserClass.populate_models_from_pks(models, [2, 3, 1])
+    assert [m.id for m in models] == [2, 3, 1]
+
+
+def test_populate_models_single_cache_lookup(app, client, monkeypatch):
+    """Cached models should be fetched with one multi-key lookup."""
+    for pk in (1, 2, 3):
+        UserClass.from_pk(pk)
+    lookups = []
+    get_dict = cache.get_dict
+    monkeypatch.setattr(cache, 'get', None)
+    monkeypatch.setattr(
+        cache,
+        'get_dict',
+        lambda *keys: lookups.append(keys) or get_dict(*keys),
+    )
+    models = []
+    UserClass.populate_models_from_pks(models, [1, 2, 3])
+    assert [m.id for m in models] == [1, 2, 3]
+    assert len(lookups) == 1
+
+
+def test_create_obj_from_cache_attaches_without_merge(
+    app, client, monkeypatch
+):
+    """Cached models not yet in the session are added, not merged."""
+    UserClass.from_pk(2)
+    db.session.expunge_all()
+    monkeypatch.setattr(db.session, 'merge', None)
+    user_class = UserClass.from_pk(2)
+    assert user_class in db.session
+    user_class.name = 'Renamed'
+    db.session.commit()
+    db.session.expunge_all()
+    assert UserClass.query.get(2).name == 'Renamed'
+
+
+def test_from_cache_miss_skips_delete(app, client, monkeypatch):
+    monkeypatch.setattr(cache, 'delete', None)
+    assert UserClass.from_pk(2).id == 2
+    assert not UserClass.from_pk(100)
+
+
+def test_from_cache_invalid_data_without_model(app, client):
+    cache.set(UserClass.create_cache_key(100), {'id': 100})
+    assert not UserClass.from_pk(100)
+    assert not cache.has(UserClass.create_cache_key(100))
+
+
+def test_new_many(app, client, sql_statements):
+    models = UserClass._new_many(
+        [{'name': 'Class A'}, {'name': 'Class B', 'permissions': ['a']}]
+    )
+    assert [m.name for m in models] == ['Class A', 'Class B']
+    assert sum(s.startswith('SELECT') for s in sql_statements) == 1
+    assert cache.get(models[1].cache_key)['permissions'] == ['a']
+    assert cache.get(models[0].cache_key)['permissions'] == []
+
+
+@pytest.mark.parametrize(
+    'pk, result',
+    [('abcdefghij', True), ('1234567890', False), ('nonexisten', False)],
+)
+@pytest.mark.parametrize('cached', [True, False])
+def test_is_valid(app, client, pk, result, cached):
+    if cached:
+        APIKey.from_pk(pk, include_dead=True)
+    assert APIKey.is_valid(pk) is result
+    # Validating an uncached object should not cache it.
+    assert bool(cache.has(APIKey.create_cache_key(pk))) is (
+        cached and pk != 'nonexisten'
+    )
+
+
+def test_is_valid_error(app, client):
+    with pytest.raises(APIException):
+        APIKey.is_valid('1234567890', error=True)
+
+
+def test_from_pk_baked_query(app, client):
+    assert UserClass.from_pk(1).id == 1
+    baked = len(_bakery.cache)
+    assert UserClass.from_pk(2).id == 2
+    assert not UserClass.from_pk(100)
+    assert len(_bakery.cache) == baked
+
+
+def test_populate_models_baked_query(app, client):
+    models = []
+    UserClass.populate_models_from_pks(models, [1])
+    baked = len(_bakery.cache)
+    cache.clear()
+    UserClass.populate_models_from_pks(models, [1, 2, 3])
+    assert [m.id for m in models] == [1, 1, 2, 3]
+    assert len(_bakery.cache) == baked
+
+
+def test_from_attrs(app, client):
+    TestDataPopulator.add_permissions('perm_one', 'perm_two')
+    assert UserPermission.from_attrs(user_id=1, permission='perm_one')
+    baked = len(_bakery.cache)
+    assert UserPermission.from_attrs(permission='perm_two', user_id=1)
+    assert not UserPermission.from_attrs(user_id=1, permission='perm_three')
+    # Same attribute names in any order reuse the same compiled query.
+    assert len(_bakery.cache) == baked
+
+
+def test_from_attrs_none(app, client, sql_statements):
+    TestDataPopulator.add_permissions('perm_one')
+    assert not UserPermission.from_attrs(user_id=1, permission=None)
+    assert 'IS NULL' in sql_statements[-1]
+    assert UserPermission.from_attrs(user_id=1, permission='perm_one')
+
+
+@pytest.mark.parametrize('detached', [True, False])
+def test_create_obj_from_cache_committed_state(app, client, detached):
+    """Models built from cached data carry no pending changes."""
+    data = cache.get(UserClass.from_pk(2).cache_key)
+    db.session.expunge_all()
+    user_class = UserClass._create_obj_from_cache(data, detached)
+    assert user_class.permissions == data['permissions']
+    assert not inspect(user_class).modified
+    assert (user_class in db.session) is not detached
+    assert not db.session.dirty
+
+
+def test_count_approximate(app, client, monkeypatch):
+    monkeypatch.setattr(UserClass, '__approx_count__', True)
+    db.session.commit()
+    db.engine.execute('ANALYZE user_classes')
+    monkeypatch.setattr(UserClass, '_construct_query', None)
+    assert UserClass.count(key='uc_count_2', attribute=UserClass.id) == 6
+    assert 0 < cache.ttl('uc_count_2') <= 60
+
+
+@pytest.mark.parametrize('estimate', [-1, 0])
+def test_count_approximate_without_estimate(
+    app, client, monkeypatch, estimate
+):
+    monkeypatch.setattr(UserClass, '__approx_count__', True)
+    monkeypatch.setattr(
+        sys.modules['core.mixins.base'],
+        'APPROX_COUNT_QUERY',
+        text(f'SELECT CAST({estimate} AS bigint) WHERE :table IS NOT NULL'),
+    )
+    assert UserClass.count(key='uc_count', attribute=UserClass.id) == 6
+
+
+def test_column_keys_cached_per_class(app, client):
+    assert UserClass._column_keys() == {'id', 'name', 'permissions'}
+    assert UserClass._column_keys() is UserClass._column_keys()
+    assert UserPermission._column_keys() == {
+        'user_id',
+        'permission',
+        'granted',
+    }
+
+
+def test_add_permissions(app, client):
+    """Permissions are inserted as bound parameters, not spliced into SQL."""
+    TestDataPopulator.add_permissions(
+        "it's_a_perm", SitePermissions.MANAGE_CACHE_KEYS
+    )
+    assert UserPermission.from_user(1) == {
+        "it's_a_perm": True,
+        'site_manage_cache_keys': True,
+    }
+
+
+def test_get_pks_of_many_composite(app, client):
+    """Composite primary keys are returned as dictionaries."""
+    TestDataPopulator.add_permissions('perm_one', 'perm_two')
+    assert UserPermission.get_pks_of_many(
+        order=UserPermission.permission
+    ) == [
+        {'user_id': 1, 'permission': 'perm_one'},
+        {'user_id': 1, 'permission': 'perm_two'},
+    ]
+
+
+def test_assign_attrs_serializer(app, client):
+    class ExtendedSerializer(ClassSerializer):
+        pass
+
+    ExtendedSerializer.assign_attrs(extra=Attribute(), not_attr=1)
+    assert 'extra' in ExtendedSerializer.attributes()
+    assert 'not_attr' not in ExtendedSerializer.attributes()
+    assert 'extra' not in ClassSerializer.attributes()
+
+
+def test_serializer_attributes_stored(app, client, monkeypatch):
+    attributes = ClassSerializer.attributes()
+    monkeypatch.setattr('core.mixins.serializer.inspect.getmembers', None)
+    assert ClassSerializer.attributes() is attributes
+    assert set(attributes) == {'id', 'name', 'permissions'}
+
+
+def test_attribute_permission_skips_ownership(app, client):
+    class Unowned:
+        def belongs_to_user(self):
+            raise AssertionError
+
+    with app.test_request_context('/test'):
+        assert Attribute().can_serialize('id', Unowned(), False)
+        assert not Attribute(nested=False).can_serialize('id', Unowned(), True)
+        assert not Attribute().can_serialize('id', Unowned(), ('name',))
+
+
+def test_populate_models_composite_pks(app, client, monkeypatch):
+    """Composite PK models are matched regardless of the PK dict order."""
+    monkeypatch.setattr(
+        UserPermission, '__cache_key__', 'perm_{user_id}_{permission}'
+    )
+    TestDataPopulator.add_permissions('perm_one', 'perm_two')
+    models = []
+    UserPermission.populate_models_from_pks(
+        models,
+        [
+            {'permission': 'perm_two', 'user_id': 1},
+            {'user_id': 1, 'permission': 'perm_one'},
+            {'user_id': 2, 'permission': 'perm_one'},
+        ],
+    )
+    assert [m.permission for m in models] == ['perm_two', 'perm_one']
+
+
+def test_primary_key_columns(app, client):
+    assert UserClass._primary_key_columns() == (UserClass.id,)
+    assert UserClass._primary_key_columns() is UserClass._primary_key_columns()
+    assert [c.key for c in UserPermission._primary_key_columns()] == [
+        'user_id',
+        'permission',
+    ]
+
+
+def test_get_primary_key_memoized(app, client, monkeypatch):
+    assert UserClass.get_primary_key() == 'id'
+    assert UserPermission.get_primary_key() == ('user_id', 'permission')
+    monkeypatch.setattr('core.mixins.single_pk.inspect', None)
+    monkeypatch.setattr('core.mixins.multi_pk.inspect', None)
+    assert UserClass.get_primary_key() == 'id'
+    assert UserPermission.get_primary_key() == ('user_id', 'permission')
+
+
+@pytest.mark.parametrize(
+    'cache_key, result',
+    [('user_class_{id}', 'user_class_5'), ('100%_{id}', '100%_5')],
+)
+def test_create_cache_key(app, client, monkeypatch, cache_key, result):
+    monkeypatch.setattr(UserClass, '__cache_key__', cache_key)
+    assert UserClass.create_cache_key(5) == result
+
+
+@pytest.mark.parametrize(
+    'cache_key', [None, 'user_class_{}', 'user_class_{name}', '{id:>4}']
+)
+def test_create_cache_key_improperly_defined(
+    app, client, monkeypatch, cache_key
+):
+    monkeypatch.setattr(UserClass, '__cache_key__', cache_key)
+    with pytest.raises(NameError):
+        UserClass.create_cache_key(5)
+
+
+def test_get_many_empty_pks(app, client, monkeypatch):
+    """No cache or database lookups should happen for an empty PK list."""
+    monkeypatch.setattr(UserClass, 'populate_models_from_pks', None)
+    assert UserClass.get_many(pks=[]) == []
+
+
+def test_get_many_required_properties(app, client):
+    UserClass.from_pk(2)
+    models = UserClass.get_many(
+        pks=[1, 2, 3], required_properties=('permissions',)
+    )
+    assert [m.id for m in models] == [2]
+
+
+def test_get_many_unfiltered_single_fetch(app, client, spy_populate):
+    """Without filters to backfill for, the models are fetched in one pass."""
+    calls = spy_populate(UserClass)
+    models = UserClass.get_many(pks=[1, 2, 3], page=1, limit=2)
+    assert [m.id for m in models] == [1, 2]
+    assert len(calls) == 1
@@ -4,11 +4,17 @@ import pytest
 
 from conftest import add_permissions, check_json_response
 from core import APIException, cache, db
-from core.notifications.models import Notification
+from core.mixins.base import _bakery
+from core.notifications import models as notification_models
+from core.notifications.models import Notification, NotificationType
 
 
 @pytest.fixture(autouse=True)
-def populate_db(client):
+def populate_db(client, monkeypatch):
+    monkeypatch.setattr(notification_models, '_ALL_TYPES', ())
+    monkeypatch.setattr(notification_models, '_TYPE_NAMES', {})
+    monkeypatch.setattr(notification_models, '_TYPE_IDS', {})
+    monkeypatch.setattr(notification_models, '_KEY_TEMPLATES', {})
     db.engine.execute(
         """INSERT INTO notifications_types (id, type) VALUES
         (1, 'subscripple'),
@@ -32,6 +38,14 @@ def populate_db(client):
     db.engine.execute("ALTER SEQUENCE notifications_id_seq RESTART WITH 7")
 
 
+def test_unread_index(client):
+    definition = db.engine.execute(
+        "SELECT indexdef FROM pg_indexes "
+        "WHERE indexname = 'ix_notifications_unread'"
+    ).scalar()
+    assert '(user_id, type_id, id) WHERE (NOT read)' in definition
+
+
 def test_new_notification(client):
     noti = Notification.new(
         user_id=1,
@@ -54,6 +68,15 @@ def test_new_notification_new_type(client):
     assert noti.read is False
 
 
+def test_notification_type_id_memoized(client, monkeypatch):
+    assert NotificationType.id_of_type('quote') == 2
+    assert NotificationType.id_of_type('bahaha') is None
+    monkeypatch.setattr(NotificationType, 'from_type', None)
+    assert NotificationType.id_of_type('quote') == 2
+    noti = Notification.new(user_id=1, type='quote', contents={'a': 'b'})
+    assert noti.type_id == 2
+
+
 def test_get_notification_model(client):
     noti = Notification.from_pk(1)
     assert noti.id == 1
@@ -63,6 +86,42 @@ def test_get_notification_model(client):
     assert noti.read is False
 
 
+def test_notification_type_name_memoized(client, monkeypatch):
+    notis = Notification.from_type(1, 'quote', include_read=True)
+    NotificationType.get_all()
+    monkeypatch.setattr(NotificationType, 'from_pk', None)
+    assert [n.type for n in notis] == ['quote', 'quote']
+
+
+def test_get_all_types_kept_in_process(client, monkeypatch):
+    assert [t.type for t in NotificationType.get_all()] == [
+        'subscripple',
+        'quote',
+        'unreal',
+    ]
+    db.session.commit()
+    monkeypatch.setattr(NotificationType, 'get_many', None)
+    types = NotificationType.get_all()
+    assert [t.type for t in types] == ['subscripple', 'quote', 'unreal']
+    assert all(t not in db.session for t in types)
+
+
+def test_get_all_types_invalidated_on_new(client):
+    NotificationType.get_all()
+    NotificationType.from_type('new_type', create_new=True)
+    assert [t.type for t in NotificationType.get_all()][-1] == 'new_type'
+    assert len(Notification.get_notification_counts(1)) == 4
+
+
+def test_get_all_types_timeout(client, monkeypatch):
+    NotificationType.get_all()
+    db.engine.execute("INSERT INTO notifications_types (type) VALUES ('x')")
+    assert len(NotificationType.get_all()) == 3
+    cache.delete(NotificationType.__cache_key_all__)
+    monkeypatch.setattr(notification_models, 'ALL_TYPES_TIMEOUT', -1)
+    assert len(NotificationType.get_all()) == 4
+
+
 def test_get_notification_counts(client):
     assert Notification.get_notification_counts(1) == {
         'subscripple': 1,
@@ -71,6 +130,63 @@ def test_get_notification_counts(client):
     }
 
 
+def test_get_notification_counts_cached_zero(client):
+    """A cached count of zero is a cache hit, not a miss."""
+    cache.set(
+        Notification.__cache_key_notification_count__.format(
+            user_id=1, type=1
+        ),
+        0,
+    )
+    assert Notification.count(
+        key=Notification.__cache_key_notification_count__.format(
+            user_id=1, type=1
+        ),
+        attribute=Notification.id,
+    ) == 0
+
+
+def test_new_notification_clears_cached_count(client):
+    assert Notification.get_notification_counts(1)['quote'] == 1
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    assert not cache.has(Notification.cache_keys_of_type(1, 2)[1])
+    assert Notification.get_notification_counts(1)['quote'] == 2
+
+
+def test_new_notification_uncached_count(client):
+    key = Notification.__cache_key_notification_count__.format(
+        user_id=1, type=2
+    )
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    assert not cache.has(key)
+    assert Notification.get_notification_counts(1)['quote'] == 2
+
+
+def test_new_many_notifications(client):
+    assert Notification.get_notification_counts(1)['quote'] == 1
+    Notification.get_pks_from_type(2, 'quote')
+    notis = Notification.new_many(
+        [
+            {'user_id': 1, 'type': 'quote', 'contents': {'contents': 'A'}},
+            {'user_id': 2, 'type': 'quote', 'contents': {'contents': 'B'}},
+            {'user_id': 1, 'type': 'quote', 'contents': {'contents': 'C'}},
+        ]
+    )
+    assert [n.id for n in notis] == [7, 8, 9]
+    assert [n.user_id for n in notis] == [1, 2, 1]
+    assert not cache.has(Notification.cache_keys_of_type(2, 2)[0])
+    assert not cache.has(Notification.cache_keys_of_type(1, 2)[1])
+    assert Notification.get_notification_counts(1)['quote'] == 3
+
+
+def test_new_many_notifications_invalid_user(client):
+    with pytest.raises(APIException):
+        Notification.new_many(
+            [{'user_id': 99, 'type': 'quote', 'contents': {'a': 'b'}}]
+        )
+    assert not Notification.query.filter(Notification.id > 6).count()
+
+
 def test_get_unread_notifications(client):
     unread = Notification.get_all_unread(1)
     assert unread['subscripple'][0].id == 1
@@ -80,12 +196,115 @@ def test_get_unread_notifications(client):
     assert len(unread['unreal']) == 0
 
 
+def test_get_unread_notifications_single_fetch(client, spy_populate):
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    calls = spy_populate(Notification)
+    unread = Notification.get_all_unread(1, limit=1)
+    assert len(calls) == 1
+    assert [n.id for n in unread['quote']] == [7]
+    assert [n.id for n in unread['subscripple']] == [1]
+    assert unread['unreal'] == []
+
+
+def test_get_unread_pks_by_type(client, monkeypatch):
+    assert Notification.get_unread_pks_by_type(1, [1, 2, 3]) == {
+        1: [1],
+        2: [3],
+        3: [],
+    }
+    assert cache.get('notifications_user_1_3') == []
+    monkeypatch.setattr(db.session, 'query', None)
+    assert Notification.get_unread_pks_by_type(1, [2, 3]) == {2: [3], 3: []}
+
+
+def test_get_unread_pks_by_type_baked(client):
+    Notification.get_unread_pks_by_type(1, [1])
+    baked = len(_bakery.cache)
+    cache.clear()
+    assert Notification.get_unread_pks_by_type(2, [1, 2, 3]) == {
+        1: [],
+        2: [2],
+        3: [5],
+    }
+    assert len(_bakery.cache) == baked
+
+
+def test_get_notification_counts_single_query(client, sql_statements):
+    NotificationType.get_all()
+    sql_statements.clear()
+    Notification.get_notification_counts(2)
+    assert len(sql_statements) == 1
+    assert Notification.get_notification_counts(2) == {
+        'subscripple': 0,
+        'quote': 1,
+        'unreal': 1,
+    }
+
+
 def test_get_notification_from_type(client):
     notis = Notification.from_type(1, 'quote')
     assert len(notis) == 1
     assert notis[0].id == 3
 
 
+def test_get_notification_from_type_cached_detached(client):
+    """Cached notifications in read-only listings aren't merged into the session."""
+    Notification.from_type(1, 'quote')
+    db.session.expunge_all()
+    notis = Notification.from_type(1, 'quote')
+    assert notis[0].id == 3
+    assert notis[0].contents == {'contents': 'A Quote!'}
+    assert notis[0] not in db.session
+
+
+@pytest.mark.parametrize(
+    'after, reverse, limit, ids',
+    [
+        (0, False, 2, [1, 3]),
+        (1, False, 2, [3, 4]),
+        (4, False, 2, [6]),
+        (6, True, 2, [4, 3]),
+        (0, False, None, [1, 3, 4, 6]),
+    ],
+)
+def test_get_many_after(client, after, reverse, limit, ids):
+    notis = Notification.get_many(
+        filter=Notification.user_id == 1,
+        include_dead=True,
+        limit=limit,
+        reverse=reverse,
+        after=after,
+    )
+    assert [n.id for n in notis] == ids
+
+
+def test_get_notification_from_type_after(client):
+    assert [n.id for n in Notification.from_type(1, 'quote', after=3)] == []
+    assert [
+        n.id
+        for n in Notification.from_type(1, 'quote', include_read=True, after=4)
+    ] == [3]
+
+
+def test_get_notification_from_type_newest_first(client):
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    assert [n.id for n in Notification.from_type(1, 'quote')] == [7, 3]
+    assert [
+        n.id for n in Notification.from_type(1, 'quote', include_read=True)
+    ] == [7, 4, 3]
+
+
+def test_unread_pks_key_order_shared(client):
+    """Whichever path fills a type's cache key, the newest come first."""
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    assert Notification.get_pks_from_type(1, 'quote') == [7, 3]
+    unread = Notification.get_all_unread(1, limit=1)
+    assert [n.id for n in unread['quote']] == [7]
+    cache.clear()
+    assert Notification.get_unread_pks_by_type(1, [2]) == {2: [7, 3]}
+    assert [n.id for n in Notification.from_type(1, 'quote')] == [7, 3]
+
+
 def test_get_notification_from_type_read(client):
     notis = Notification.from_type(1, 'unreal')
     assert len(notis) == 0
@@ -107,6 +326,62 @@ def test_get_pks_from_type(client):
     assert pks == [1]
 
 
+def test_update_many_clears_cache(client):
+    Notification.from_pk(1)
+    Notification.from_pk(3)
+    Notification.update_many(pks=[1, 3, 5], update={'read': True})
+    assert not cache.has('notifications_1')
+    assert not cache.has('notifications_3')
+    assert Notification.from_pk(1, include_dead=True).read is True
+
+
+def test_update_many_sychronize_session_deprecated(client):
+    with pytest.deprecated_call():
+        Notification.update_many(
+            pks=[1], update={'read': True}, sychronize_session=True
+        )
+    assert Notification.from_pk(1, include_dead=True).read is True
+
+
+def test_update_many_only_touches_matched(client, monkeypatch):
+    Notification.from_pk(1)
+    cache.set('notifications_100', {'id': 100})
+    deleted = []
+    delete_many = cache.delete_many
+    monkeypatch.setattr(
+        cache,
+        'delete_many',
+        lambda *keys: deleted.extend(keys) or delete_many(*keys),
+    )
+    Notification.update_many(pks=[1, 100], update={'read': ~Notification.read})
+    assert deleted == ['notifications_1']
+    assert cache.has('notifications_100')
+
+
+def test_update_many_no_matches(client, monkeypatch):
+    monkeypatch.setattr(cache, 'delete_many', None)
+    Notification.update_many(pks=[100, 101], update={'read': True})
+
+
+def test_update_many_expression_clears_cache(client):
+    Notification.from_pk(1)
+    Notification.update_many(pks=[1], update={'read': ~Notification.read})
+    assert not cache.has('notifications_1')
+    assert Notification.from_pk(1, include_dead=True).read is True
+
+
+def test_cache_keys_of_type(client):
+    assert Notification.cache_keys_of_type(1, 2) == (
+        Notification.__cache_key_of_user__.format(user_id=1, type=2),
+        Notification.__cache_key_notification_count__.format(
+            user_id=1, type=2
+        ),
+    )
+    assert Notification.cache_keys_of_type(3, 2)[1] == (
+        'notifications_user_3_2_count'
+    )
+
+
 def test_clear_cache_keys(client):
     ckey = Notification.__cache_key_notification_count__.format(
         user_id=1, type=1
@@ -145,6 +420,35 @@ def test_view_notifications(app, authed_client):
     ] == {'contents': 'A Quote!'}
 
 
+def test_view_notifications_not_modified(app, authed_client):
+    add_permissions(app, 'notifications_view')
+    response = authed_client.get('/notifications')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    response = authed_client.get(
+        '/notifications', headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+    assert not response.get_data()
+    Notification.new(user_id=1, type='quote', contents={'contents': 'Hi!'})
+    response = authed_client.get(
+        '/notifications', headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 200
+    assert len(response.get_json()['response']['quote']) == 2
+
+
+def test_view_notifications_cache_keys_not_conditional(app, authed_client):
+    add_permissions(app, 'notifications_view', 'site_manage_cache_keys')
+    response = authed_client.get('/notifications')
+    assert 'ETag' not in response.headers
+    response = authed_client.get(
+        '/notifications', headers={'If-None-Match': 'W/"anything"'}
+    )
+    assert response.status_code == 200
+    assert 'cache_keys' in response.get_json()
+
+
 def test_view_notification_of_type(app, authed_client):
     add_permissions(app, 'notifications_view')
     response = authed_client.get('/notifications/quote').get_json()['response']
@@ -152,6 +456,29 @@ def test_view_notification_of_type(app, authed_client):
     assert response[0]['type'] == 'quote'
 
 
+def test_view_notification_of_type_paginated(app, authed_client):
+    add_permissions(app, 'notifications_view')
+    for i in range(26):
+        Notification.new(user_id=1, type='quote', contents={'contents': i})
+    response = authed_client.get(
+        '/notifications/quote', query_string={'limit': 25, 'page': 2}
+    ).get_json()['response']
+    assert [n['id'] for n in response] == [7, 3]
+    response = authed_client.get(
+        '/notifications/quote',
+        query_string={'limit': 25, 'include_read': True, 'after': 8},
+    ).get_json()['response']
+    assert [n['id'] for n in response] == [7, 4, 3]
+
+
+def test_view_notification_of_type_invalid_after(app, authed_client):
+    add_permissions(app, 'notifications_view')
+    response = authed_client.get(
+        '/notifications/quote', query_string={'after': 'abc'}
+    )
+    assert response.status_code == 400
+
+
 def test_view_notification_of_type_include_read(app, authed_client):
     add_permissions(app, 'notifications_view')
     response = authed_client.get(
@@ -191,6 +518,23 @@ def test_clear_notifications_type(app, authed_client):
     assert len(n['subscripple']) == 1
 
 
+def test_read_all(client, monkeypatch):
+    Notification.from_pk(1)
+    Notification.from_pk(3)
+    Notification.get_notification_counts(1)
+    monkeypatch.setattr(Notification, 'update_many', None)
+    Notification.read_all(1, 'quote')
+    assert cache.has('notifications_1')
+    assert not cache.has('notifications_3')
+    assert Notification.get_notification_counts(1) == {
+        'subscripple': 1,
+        'quote': 0,
+        'unreal': 0,
+    }
+    assert Notification.from_pk(3, include_dead=True).read is True
+    assert Notification.from_pk(2).read is False
+
+
 def test_modify_notification(app, authed_client):
     add_permissions(app, 'notifications_modify')
     response = authed_client.put(
@@ -1,4 +1,5 @@
 from core.users.models import User
+from core.utils import cached_classmethod
 
 
 def test_cached_property(app, client, monkeypatch):
@@ -7,3 +8,22 @@ def test_cached_property(app, client, monkeypatch):
     assert user.user_class == 'User'
     monkeypatch.setattr('core.users.models.User.user_class_model', None)
     assert user.user_class == 'User'
+
+
+def test_cached_classmethod():
+    """Test that the result is cached per class, not shared with subclasses."""
+    calls = []
+
+    class Parent:
+        @cached_classmethod
+        def name(cls):
+            calls.append(cls)
+            return cls.__name__
+
+    class Child(Parent):
+        pass
+
+    assert Parent.name() == 'Parent'
+    assert Parent.name() == 'Parent'
+    assert Child.name() == 'Child'
+    assert calls == [Parent, Child]
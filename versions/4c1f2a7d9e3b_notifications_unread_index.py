@@ -0,0 +1,29 @@
+"""notifications unread index
+
+Revision ID: 4c1f2a7d9e3b
+Revises: 9768bc970df0
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f2a7d9e3b'
+down_revision = '9768bc970df0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_notifications_unread',
+        'notifications',
+        ['user_id', 'type_id', 'id'],
+        postgresql_where=sa.text('NOT read'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_notifications_unread', table_name='notifications')